@@ -5,6 +5,7 @@ from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from src.api.routes import router
 from src.core.websocket_handler import websocket_manager
+from src.services.realtime_service import close_warm_pool
 
 # Configure logging
 logging.basicConfig(
@@ -161,12 +162,15 @@ async def websocket_endpoint(websocket: WebSocket):
             await websocket.close()
     
     except Exception as e:
-        logger.error(f"Error in WebSocket handler: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error in WebSocket handler: {str(e)}")
         if stream_sid:
             websocket_manager.disconnect(stream_sid)
 
+# Close pre-dialed OpenAI connections
+@app.on_event("shutdown")
+async def shutdown():
+    await close_warm_pool()
+
 # Health check route
 @app.get("/health")
 async def health():
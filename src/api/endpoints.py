@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Request, Form, Response
 from pydantic import BaseModel, HttpUrl
 from src.core.twilio_handler import TwilioHandler
 from twilio.twiml.voice_response import VoiceResponse, Gather
+import asyncio
 import logging
 import datetime
 
@@ -106,8 +107,8 @@ async def handle_twilio_webhook(
             "transcription_status": TranscriptionStatus
         }
         
-        # Store in GCS
-        storage_result = storage_service.store_conversation(CallSid, conversation_data)
+        # Store in GCS; uploads block and may back off, so keep them off the event loop
+        storage_result = await asyncio.to_thread(storage_service.store_conversation, CallSid, conversation_data)
         logger.info(f"Stored conversation data: {storage_result}")
         
         # Return a response as JSON
@@ -246,8 +247,8 @@ async def handle_twilio_webhook(
             "audio_url": RecordingUrl
         }
         
-        # Store conversation in GCS
-        storage_result = storage_service.store_conversation(CallSid, conversation_data)
+        # Store conversation in GCS, off the event loop
+        storage_result = await asyncio.to_thread(storage_service.store_conversation, CallSid, conversation_data)
         
         response = {
             "call_sid": CallSid,
@@ -317,8 +318,8 @@ async def handle_recording_status(request: Request):
                     "transcript": transcript
                 }
                 
-                # Store metadata in GCS
-                storage_result = storage_service.store_recording_metadata(CallSid, recording_data)
+                # Store metadata in GCS, off the event loop
+                storage_result = await asyncio.to_thread(storage_service.store_recording_metadata, CallSid, recording_data)
                 print(f"✅ Recording metadata and transcript stored in GCS: {storage_result}")
                 logger.info(f"Recording metadata and transcript stored in GCS: {storage_result}")
                 
@@ -408,7 +409,8 @@ async def test_openai():
 import os
 import logging
 from fastapi import Request, Response, Form, HTTPException
-from src.services.realtime_service import RealtimeService
+from src.services.realtime_service import RealtimeService, CONNECT_GREETINGS, build_connect_twiml
+from src.utils.helpers import normalize_ngrok_url
 from twilio.twiml.voice_response import VoiceResponse, Connect, Stream
 
 logger = logging.getLogger(__name__)
@@ -425,13 +427,7 @@ async def handle_realtime_call(request: Request):
             ngrok_url = host
         
         # Remove protocol if present and any trailing slashes
-        if ngrok_url.startswith('http://'):
-            ngrok_url = ngrok_url[7:]
-        elif ngrok_url.startswith('https://'):
-            ngrok_url = ngrok_url[8:]
-            
-        if ngrok_url.endswith('/'):
-            ngrok_url = ngrok_url[:-1]
+        ngrok_url = normalize_ngrok_url(ngrok_url)
         
         logger.info(f"Using base URL for Twilio: {ngrok_url}")
         
@@ -481,14 +477,7 @@ async def handle_salon_call(request: Request):
         logger.info(f"Using base URL for Twilio salon call: {ngrok_url}")
          
         # Clean the URL properly
-        if ngrok_url.startswith('http://'):
-            ngrok_url = ngrok_url[7:]
-        elif ngrok_url.startswith('https://'):
-            ngrok_url = ngrok_url[8:]
-        
-        # Remove trailing slash if present
-        if ngrok_url.endswith('/'):
-            ngrok_url = ngrok_url[:-1]
+        ngrok_url = normalize_ngrok_url(ngrok_url)
         
         # Form the WebSocket URL correctly
         stream_url = f"wss://{ngrok_url}/realtime-stream"
@@ -500,18 +489,7 @@ async def handle_salon_call(request: Request):
         logger.info(f"Using WebSocket URL with parameter: {stream_url_with_param}")
         
         # Create TwiML response
-        response = VoiceResponse()
-        response.say("Please wait while we connect you to Elegant Styles salon booking assistant.", voice="alice")
-        response.pause(length=1)
-        
-        # Add the stream with explicit type parameter
-        connect = Connect()
-        connect.stream(url=stream_url_with_param)
-        response.append(connect)
-        
-        response.say("You're now connected. Please start speaking.", voice="alice")
-        
-        twiml_response = str(response)
+        twiml_response = build_connect_twiml(CONNECT_GREETINGS["salon"], stream_url_with_param)
         logger.info(f"Generated TwiML response for salon: {twiml_response}")
         
         # Return TwiML response
@@ -566,36 +544,15 @@ async def handle_restaurant_call(request: Request):
             ngrok_url = host
         
         # Clean the URL properly
-        if ngrok_url.startswith('http://'):
-            ngrok_url = ngrok_url[7:]
-        elif ngrok_url.startswith('https://'):
-            ngrok_url = ngrok_url[8:]
-        
-        # Remove trailing slash if present
-        if ngrok_url.endswith('/'):
-            ngrok_url = ngrok_url[:-1]
+        ngrok_url = normalize_ngrok_url(ngrok_url)
         
         logger.info(f"Using base URL for Twilio restaurant call: {ngrok_url}")
         
         # Form the WebSocket URL correctly
         stream_url = f"wss://{ngrok_url}/realtime-stream"
         
-        # Explicitly initialize with restaurant type
-        realtime_service = RealtimeService(business_type="restaurant")
-        
         # Create the response
-        response = VoiceResponse()
-        response.say("Please wait while we connect you to Gourmet Delights restaurant booking assistant.", voice="alice")
-        response.pause(length=1)
-        
-        # Add the stream with explicit type
-        connect = Connect()
-        connect.stream(url=f"{stream_url}?type=restaurant")
-        response.append(connect)
-        
-        response.say("You're now connected. Please start speaking.", voice="alice")
-        
-        twiml_response = str(response)
+        twiml_response = build_connect_twiml(CONNECT_GREETINGS["restaurant"], f"{stream_url}?type=restaurant")
         logger.info(f"Generated TwiML response for restaurant: {twiml_response}")
         
         # Return TwiML response
@@ -1,18 +1,60 @@
 from google.cloud import storage
+from google.cloud.storage.retry import DEFAULT_RETRY
+from google.api_core import exceptions as gcs_exceptions
 from google.oauth2 import service_account
+from google.auth.transport.requests import AuthorizedSession
 from datetime import datetime
+import contextlib
 import os
+import time
 import requests
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import Union
+from typing import Iterator, Union
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Resumable upload chunk size for streamed files, a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# OAuth scopes for the service account
+GCS_SCOPES = ("https://www.googleapis.com/auth/cloud-platform",)
+
+# Keep-alive connections per host; conversation uploads run several at once
+HTTP_POOL_SIZE = 32
+
+# Partial-response mask for listings: just what iter_files reports, plus paging
+LIST_FIELDS = "items(name,size,updated),nextPageToken"
+
+# Upload attempts per file, with exponential backoff (1s, 2s, ...) between them
+UPLOAD_ATTEMPTS = 3
+UPLOAD_BACKOFF_BASE = 1.0
+
+# Failures worth retrying: throttling, server errors and dropped connections
+TRANSIENT_UPLOAD_ERRORS = (
+    gcs_exceptions.TooManyRequests,
+    gcs_exceptions.ServerError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+def upload_with_retry(blob, data: Union[str, bytes], content_type: str) -> None:
+    """Upload data to a blob, retrying transient failures with exponential backoff"""
+    for attempt in range(UPLOAD_ATTEMPTS):
+        try:
+            blob.upload_from_string(data, content_type=content_type)
+            return
+        except TRANSIENT_UPLOAD_ERRORS as e:
+            if attempt == UPLOAD_ATTEMPTS - 1:
+                raise
+            delay = UPLOAD_BACKOFF_BASE * 2 ** attempt
+            logger.warning(f"Upload of {blob.name} failed ({e}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+
 class CloudStorage:
     def __init__(self):
         try:
@@ -34,10 +76,11 @@ class CloudStorage:
             logger.info(f"Loading credentials from: {creds_path}")
             
             # Initialize with explicit credentials
+            # Self-signed JWTs skip the round-trip to the OAuth token endpoint
             credentials = service_account.Credentials.from_service_account_file(
                 creds_path,
-                scopes=["https://www.googleapis.com/auth/cloud-platform"]
-            )
+                scopes=GCS_SCOPES
+            ).with_always_use_jwt_access(True)
             
             
             # Get project ID and bucket name
@@ -53,10 +96,17 @@ class CloudStorage:
             logger.info(f"Using project_id: {self.project_id}, bucket_name: {self.bucket_name}")
 
 
-            # Initialize storage client
+            # Initialize storage client on a session whose connection pool is large
+            # enough for concurrent uploads to reuse warm TLS connections
+            session = AuthorizedSession(credentials)
+            session.mount("https://", requests.adapters.HTTPAdapter(
+                pool_connections=HTTP_POOL_SIZE,
+                pool_maxsize=HTTP_POOL_SIZE
+            ))
             self.client = storage.Client(
                 credentials=credentials,
-                project=self.project_id
+                project=self.project_id,
+                _http=session
             )
             
             # Get or create bucket with proper folder structure
@@ -118,21 +168,69 @@ class CloudStorage:
             if not content_bytes:
                 logger.warning(f"Content is empty for file: {file_path}")
                 
+            # Large files go up as a resumable upload in UPLOAD_CHUNK_SIZE pieces, so a
+            # dropped connection only resends the current chunk
+            if len(content_bytes) > UPLOAD_CHUNK_SIZE:
+                blob.chunk_size = UPLOAD_CHUNK_SIZE
+            
             # Upload content
             logger.info(f"Uploading {len(content_bytes)} bytes to {file_path}")
-            blob.upload_from_string(content_bytes, content_type=content_type)
+            upload_with_retry(blob, content_bytes, content_type)
             
             # Get public URL
             gcs_url = f"gs://{self.bucket_name}/{file_path}"
             logger.info(f"Successfully stored file at: {gcs_url}")
             return gcs_url
         except Exception as e:
-            logger.error(f"Failed to store file {file_path}: {str(e)}")
-            # Print stack trace for debugging
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception(f"Failed to store file {file_path}: {str(e)}")
             raise
 
+    @contextlib.contextmanager
+    def open_stream(self, file_path: str, content_type: str = 'application/octet-stream'):
+        """
+        Open a GCS file for streaming writes, uploaded in chunks as it is written
+        
+        The file is only finalized if the block completes. If it raises, the
+        upload is cancelled instead of committing a truncated object.
+        """
+        logger.info(f"Opening upload stream at path: {file_path}")
+        blob = self.bucket.blob(file_path)
+        # ignore_flush lets writers such as wave call flush() on the stream. Each
+        # chunk is retried on transient errors; the paths are unique per call, so
+        # an unconditional retry cannot overwrite another upload
+        writer = blob.open(
+            "wb",
+            chunk_size=UPLOAD_CHUNK_SIZE,
+            ignore_flush=True,
+            content_type=content_type,
+            retry=DEFAULT_RETRY
+        )
+        try:
+            yield writer
+            writer.close()
+        except BaseException:
+            self._abort_stream(writer, file_path)
+            raise
+
+    @staticmethod
+    def _abort_stream(writer, file_path: str) -> None:
+        """Cancel a streamed upload without finalizing it"""
+        # BlobWriter has no abort in this client version, and both close() and
+        # garbage collection would finalize what was written so far. Closing its
+        # buffer marks it closed, then the resumable session is cancelled.
+        upload_and_transport = writer._upload_and_transport
+        writer._buffer.close()
+        if upload_and_transport:
+            upload, transport = upload_and_transport
+            try:
+                transport.delete(upload.upload_url)
+            except Exception as e:
+                logger.warning(f"Could not cancel upload of {file_path}: {str(e)}")
+
+    def get_url(self, file_path: str) -> str:
+        """Return the gs:// URL of a file in the bucket"""
+        return f"gs://{self.bucket_name}/{file_path}"
+
     def store_transcript(self, call_sid: str, transcript: str) -> str:
         """Store conversation transcript"""
         try:
@@ -169,18 +267,26 @@ class CloudStorage:
             List of file metadata dictionaries
         """
         try:
-            files = []
-            blobs = self.bucket.list_blobs(prefix=prefix)
-            for blob in blobs:
-                # Skip placeholder files
-                if not blob.name.endswith('.placeholder'):
-                    files.append({
-                        'name': blob.name,
-                        'size': blob.size,
-                        'updated': blob.updated,
-                        'url': f"gs://{self.bucket_name}/{blob.name}"
-                    })
-            return files
+            return list(self.iter_files(prefix))
         except Exception as e:
             logger.error(f"Failed to list files with prefix {prefix}: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def iter_files(self, prefix: str = None) -> Iterator[dict]:
+        """
+        Iterate over files in bucket with optional prefix, fetched page by page
+        
+        Unlike list_files, nothing is requested until iteration starts, and
+        errors are raised (unlogged) while iterating.
+        """
+        # Only ask GCS for the fields reported below, not full blob metadata
+        blobs = self.bucket.list_blobs(prefix=prefix, fields=LIST_FIELDS)
+        for blob in blobs:
+            # Skip placeholder files
+            if not blob.name.endswith('.placeholder'):
+                yield {
+                    'name': blob.name,
+                    'size': blob.size,
+                    'updated': blob.updated,
+                    'url': self.get_url(blob.name)
+                }
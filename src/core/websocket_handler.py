@@ -1,16 +1,51 @@
-import json
 import logging
 import asyncio
+# pybase64 is a SIMD drop-in for the stdlib module; use it when installed
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List, Optional
+from typing import Dict, Optional
 from src.services.realtime_service import RealtimeService
 from src.services.storage_service import StorageService
 from src.services.realtime_storage_service import RealtimeStorageService
+from src.utils.helpers import json_loads, json_dumps
 import websockets
 
 
 logger = logging.getLogger(__name__)
 
+# Twilio media frames start with the event name and carry the audio as "payload"
+# inside the "media" object
+MEDIA_FRAME_PREFIX = '{"event":"media"'
+MEDIA_OBJECT_FIELD = '"media":{'
+MEDIA_PAYLOAD_FIELD = '"payload":"'
+
+
+def _media_payload(message: str) -> Optional[str]:
+    """
+    Slice the base64 audio out of a Twilio media frame without parsing it
+    
+    Media frames are nearly all of the inbound traffic. Base64 never contains
+    quotes, so the payload runs up to the next quote. Returns None for any
+    other frame, or one with escaped characters, which is then parsed normally.
+    """
+    if not message.startswith(MEDIA_FRAME_PREFIX) or '\\' in message:
+        return None
+    media = message.find(MEDIA_OBJECT_FIELD)
+    if media == -1:
+        return None
+    start = message.find(MEDIA_PAYLOAD_FIELD, media)
+    # The media object holds only strings, so a brace before the payload means it closed
+    if start == -1 or message.find('}', media, start) != -1:
+        return None
+    start += len(MEDIA_PAYLOAD_FIELD)
+    end = message.find('"', start)
+    if end == -1:
+        return None
+    return message[start:end]
+
 class WebSocketManager:
     """Manager for WebSocket connections from Twilio Media Streams"""
     
@@ -19,8 +54,8 @@ class WebSocketManager:
         self.realtime_services: Dict[str, RealtimeService] = {}
         self.storage_service = StorageService()
         self.realtime_storage_service = RealtimeStorageService()
-        # Keep track of audio chunks per call
-        self.audio_chunks: Dict[str, List[str]] = {}
+        # Raw g711_ulaw audio per call and speaker, decoded as it arrives
+        self.audio_chunks: Dict[str, Dict[str, bytearray]] = {}
     
     # Update the connect method to properly initialize RealtimeService
 
@@ -40,7 +75,7 @@ class WebSocketManager:
                     # First, we should receive a 'connected' event
                     logger.info("Waiting for initial connection message from Twilio...")
                     message = await websocket.receive_text()
-                    data = json.loads(message)
+                    data = json_loads(message)
                     
                     if data.get('event') == 'connected':
                         logger.info("Received 'connected' event from Twilio")
@@ -48,7 +83,7 @@ class WebSocketManager:
                         # Now wait for the 'start' event which contains the stream_sid
                         logger.info("Waiting for 'start' event from Twilio...")
                         message = await websocket.receive_text()
-                        data = json.loads(message)
+                        data = json_loads(message)
                     
                     if data.get('event') == 'start':
                         stream_sid = data['start']['streamSid']
@@ -107,13 +142,14 @@ class WebSocketManager:
         
         # Track websocket state to avoid errors after closure
         websocket_closed = False
+        audio_sender = None
         
         try:
-            # Initialize audio chunks list for this call
+            # Initialize audio buffers for this call
             if call_sid not in self.audio_chunks:
                 self.audio_chunks[call_sid] = {
-                    "user": [],
-                    "assistant": []
+                    "user": bytearray(),
+                    "assistant": bytearray()
                 }
             
             # Initialize the OpenAI session with correct business type
@@ -123,39 +159,25 @@ class WebSocketManager:
                 return
             
             # Rest of the method...
+            # Audio from OpenAI is queued and sent to Twilio by its own task, so
+            # the OpenAI receive loop never waits on the Twilio socket
+            audio_queue = asyncio.Queue()
+            audio_sender = asyncio.create_task(
+                self._send_queued_audio(websocket, stream_sid, audio_queue)
+            )
+
             # Define a callback to send audio back to Twilio
             def send_audio_to_twilio(audio_data: str):
-                """Send audio data back to Twilio via the WebSocket"""
-                nonlocal websocket_closed  # Move this to the beginning of the function
-
-                try:
-                    # Skip sending if websocket is closed
-                    if websocket_closed:
-                        logger.debug("WebSocket closed, not sending audio")
-                        return
-
-                    # Construct the media message
-                    message = {
-                        "event": "media",
-                        "streamSid": stream_sid,
-                        "media": {
-                            "payload": audio_data
-                        }
-                    }
-                    
-                    # Store the audio chunk for later persistence
-                    self.audio_chunks[call_sid]["assistant"].append(audio_data)
-                    
-                    # Use asyncio.create_task to handle the async send operation
-                    asyncio.create_task(websocket.send_json(message))
-
-                except websockets.exceptions.ConnectionClosed:
-                    # Connection already closed, mark as such
-                    websocket_closed = True
-                    logger.info(f"WebSocket already closed for stream {stream_sid}")
-
-                except Exception as e:
-                    logger.error(f"Error sending audio to Twilio: {str(e)}")
+                """Queue audio data to be sent back to Twilio"""
+                # Skip sending if websocket is closed
+                if websocket_closed or audio_sender.done():
+                    logger.debug("WebSocket closed, not sending audio")
+                    return
+                
+                # Store the audio chunk for later persistence
+                self.audio_chunks[call_sid]["assistant"] += base64.b64decode(audio_data)
+                
+                audio_queue.put_nowait(audio_data)
             
             # Start a task to handle events from OpenAI AFTER the connection is established
             openai_task = asyncio.create_task(
@@ -166,13 +188,15 @@ class WebSocketManager:
             while True:
                 try:
                     message = await websocket.receive_text()
-                    data = json.loads(message)
+                    audio_payload = _media_payload(message)
+                    if audio_payload is None:
+                        data = json_loads(message)
+                        if data['event'] == 'media':
+                            audio_payload = data['media']['payload']
                     
-                    if data['event'] == 'media':
+                    if audio_payload is not None:
                         # Process the audio data
-                        audio_payload = data['media']['payload']
-                        
-                        self.audio_chunks[call_sid]["user"].append(audio_payload)
+                        self.audio_chunks[call_sid]["user"] += base64.b64decode(audio_payload)
                         # Send to OpenAI
                         await realtime_service.process_audio_chunk(audio_payload)
                     
@@ -197,6 +221,8 @@ class WebSocketManager:
             # Clean up
             # Mark the websocket as closed to prevent further send attempts
             websocket_closed = True
+            if audio_sender is not None:
+                audio_sender.cancel()
             if call_sid in self.realtime_services:
                 await self.realtime_services[call_sid].close_session()
                 
@@ -205,7 +231,7 @@ class WebSocketManager:
                     if realtime_service.conversation_history:
                         await self.realtime_storage_service.store_realtime_conversation(
                             call_sid, 
-                            realtime_service.conversation_history,
+                            realtime_service.get_history(),
                             self.audio_chunks.get(call_sid, {}),
                             business_type
                         )
@@ -221,31 +247,48 @@ class WebSocketManager:
             
             self.disconnect(stream_sid)
 
+    async def _send_queued_audio(self, websocket: WebSocket, stream_sid: str, audio_queue: asyncio.Queue) -> None:
+        """Send queued OpenAI audio to Twilio in order, one media message at a time"""
+        # Reuse one media envelope per stream; it is serialized before each send
+        message = {
+            "event": "media",
+            "streamSid": stream_sid,
+            "media": {
+                "payload": None
+            }
+        }
+        media = message["media"]
+        
+        try:
+            while True:
+                media["payload"] = await audio_queue.get()
+                await websocket.send_text(json_dumps(message))
+        except (WebSocketDisconnect, websockets.exceptions.ConnectionClosed):
+            logger.info(f"WebSocket already closed for stream {stream_sid}")
+        except Exception as e:
+            logger.error(f"Error sending audio to Twilio: {str(e)}")
+
     # Add this new method to handle the stream with an existing service
 
     async def handle_stream_with_service(self, websocket: WebSocket, stream_sid: str, call_sid: str, realtime_service):
         """Handle a stream with an already initialized RealtimeService"""
         # Track websocket state to avoid errors after closure
         websocket_closed = False
+        audio_sender = None
         
         try:
+            # Audio from OpenAI is queued and sent to Twilio by its own task, so
+            # the OpenAI receive loop never waits on the Twilio socket
+            audio_queue = asyncio.Queue()
+            audio_sender = asyncio.create_task(
+                self._send_queued_audio(websocket, stream_sid, audio_queue)
+            )
+
             # Define a callback to send audio back to Twilio
             def send_audio_to_twilio(audio_data: str):
-                """Send audio data back to Twilio via the WebSocket"""
-                if not websocket_closed:  # Check flag before sending
-                    try:
-                        # Wrap in a media message
-                        message = {
-                            "event": "media",
-                            "streamSid": stream_sid,
-                            "media": {
-                                "payload": audio_data
-                            }
-                        }
-                        # Send to Twilio - we can't use await here
-                        asyncio.create_task(websocket.send_text(json.dumps(message)))
-                    except Exception as e:
-                        logger.error(f"Error sending audio to Twilio: {e}")
+                """Queue audio data to be sent back to Twilio"""
+                if not websocket_closed and not audio_sender.done():  # Check flag before sending
+                    audio_queue.put_nowait(audio_data)
                         
             # Start a task to handle events from OpenAI
             openai_task = asyncio.create_task(
@@ -262,18 +305,20 @@ class WebSocketManager:
                         
                     # Receive message from Twilio
                     message = await websocket.receive_text()
-                    data = json.loads(message)
+                    payload = _media_payload(message)
+                    if payload is None:
+                        data = json_loads(message)
+                        if data.get('event') == 'media':
+                            payload = data.get('media', {}).get('payload')
                     
                     # Handle media events (audio from Twilio)
-                    if data.get('event') == 'media':
-                        if 'media' in data and 'payload' in data['media']:
-                            # Store the raw audio chunk for later
-                            payload = data['media']['payload']
-                            if call_sid in self.audio_chunks:
-                                self.audio_chunks[call_sid]["user"].append(payload)
-                            
-                            # Process the audio through the realtime service
-                            await realtime_service.process_audio_chunk(payload)
+                    if payload is not None:
+                        # Store the raw audio chunk for later
+                        if call_sid in self.audio_chunks:
+                            self.audio_chunks[call_sid]["user"] += base64.b64decode(payload)
+                        
+                        # Process the audio through the realtime service
+                        await realtime_service.process_audio_chunk(payload)
                     
                     # Handle stop events
                     elif data.get('event') == 'stop':
@@ -286,14 +331,14 @@ class WebSocketManager:
                 websocket_closed = True
                 
             except Exception as e:
-                logger.error(f"Error processing WebSocket message: {str(e)}")
-                import traceback
-                logger.error(traceback.format_exc())
+                logger.exception(f"Error processing WebSocket message: {str(e)}")
                 websocket_closed = True
                 
         finally:
             # Final cleanup
             websocket_closed = True
+            if audio_sender is not None:
+                audio_sender.cancel()
             
             # Clean up the OpenAI connection
             if call_sid in self.realtime_services:
@@ -308,7 +353,7 @@ class WebSocketManager:
                 try:
                     await self.realtime_storage_service.store_realtime_conversation(
                         call_sid,
-                        service.conversation_history,
+                        service.get_history(),
                         self.audio_chunks.get(call_sid),
                         service.business_type
                     )
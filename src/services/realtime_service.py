@@ -1,14 +1,19 @@
 import os
 import json
-import base64
 import logging
 import websockets
 import asyncio
-import traceback
-from typing import Dict, List, Optional, Callable
+import collections
+import functools
+import heapq
+import random
+import sys
+from typing import Dict, List, Optional, Callable, Set
 from twilio.twiml.voice_response import VoiceResponse, Connect, Stream
 from openai import OpenAI  
 import shutil
+import ssl
+from src.utils.helpers import normalize_ngrok_url, json_loads as _loads, json_dumps as _dumps
 
 from agents import Agent, Runner, gen_trace_id, trace
 from agents.mcp import MCPServer, MCPServerStdio
@@ -16,9 +21,279 @@ from agents.mcp import MCPServer, MCPServerStdio
 
 logger = logging.getLogger(__name__)
 
+# Connection settings for the OpenAI Realtime WebSocket
+CONNECT_TIMEOUT = 2.0
+CONNECT_BACKOFF_BASE = 0.1
+CONNECT_BACKOFF_MAX = 1.0
+
+# One TLS context for every Realtime connection, so the CA bundle is loaded once
+_SSL_CONTEXT = ssl.create_default_context()
+
+# Cap concurrent handshakes so a burst of calls doesn't start a TLS storm
+MAX_CONCURRENT_HANDSHAKES = 8
+_handshake_slots = asyncio.Semaphore(MAX_CONCURRENT_HANDSHAKES)
+
+# Pre-dialed, never-used Realtime connections kept per model so a new call can
+# skip the TCP/TLS/upgrade handshake. Connections are never returned after a
+# call: a Realtime session carries the previous caller's conversation.
+WARM_POOL_SIZE = 1
+WARM_MAX_AGE = 300.0
+
+# Menus extracted through MCP are cached here, keyed by the sample files they came from
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MENU_CACHE_DIR = os.path.join(PROJECT_ROOT, ".cache")
+
+# Seconds to wait for a user transcript before adding a placeholder
+PLACEHOLDER_DELAY = 2.0
+
+# Characters of the last assistant message quoted in a placeholder
+ASSISTANT_PREVIEW_LENGTH = 30
+
+# History text for a user turn whose transcript never arrived
+PLACEHOLDER_WITH_CONTEXT = "[User response not transcribed [Responding to: '{preview}...']]"
+PLACEHOLDER_NO_CONTEXT = "[User response not transcribed ]"
+
+# Number of recent history entries kept indexed for transcript lookups
+HISTORY_WINDOW = 32
+
+# Function calls a single call may have executing at once
+MAX_CONCURRENT_FUNCTION_CALLS = 8
+
+# Realtime API event types, interned so dispatch lookups can short-circuit on identity
+EVENT_ERROR = sys.intern("error")
+EVENT_RESPONSE_DONE = sys.intern("response.done")
+EVENT_AUDIO_DELTA = sys.intern("response.audio.delta")
+EVENT_FUNCTION_ARGS_DELTA = sys.intern("response.function_call_arguments.delta")
+EVENT_FUNCTION_ARGS_DONE = sys.intern("response.function_call_arguments.done")
+EVENT_ASSISTANT_TRANSCRIPT_DELTA = sys.intern("response.audio_transcript.delta")
+EVENT_USER_TRANSCRIPT_DELTA = sys.intern("conversation.item.input_audio_transcription.delta")
+EVENT_USER_TRANSCRIPT_COMPLETED = sys.intern("conversation.item.input_audio_transcription.completed")
+EVENT_SPEECH_STARTED = sys.intern("input_audio_buffer.speech_started")
+EVENT_SPEECH_STOPPED = sys.intern("input_audio_buffer.speech_stopped")
+EVENT_BUFFER_COMMITTED = sys.intern("input_audio_buffer.committed")
+
+# Envelope of response.audio.delta server events, see handle_realtime_events
+AUDIO_DELTA_PREFIX = '{"type":"response.audio.delta"'
+AUDIO_DELTA_FIELD = '"delta":"'
+
+# Pre-serialized client events sent on every audio frame / turn
+AUDIO_APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+AUDIO_APPEND_SUFFIX = '"}'
+RESPONSE_CREATE = '{"type":"response.create"}'
+INITIAL_PROMPT_ITEM = _dumps({
+    "type": "conversation.item.create",
+    "item": {
+        "type": "message",
+        "role": "user",
+        "content": [
+            {
+                "type": "input_text",
+                "text": "Please greet the user and ask for their name."
+            }
+        ]
+    }
+})
+
+# Conversation history role tags
+ROLE_USER = sys.intern("user")
+ROLE_ASSISTANT = sys.intern("assistant")
+
+
+async def _dial_realtime(model: str, api_key: str):
+    """Open a WebSocket to the OpenAI Realtime API, bounded by CONNECT_TIMEOUT"""
+    async with _handshake_slots:
+        return await asyncio.wait_for(
+            websockets.connect(
+                f'wss://api.openai.com/v1/realtime?model={model}',
+                additional_headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "OpenAI-Beta": "realtime=v1"
+                },
+                ping_interval=20,  # Send regular pings to keep connection alive
+                ping_timeout=20,   # Wait 20 seconds for pong before considering dead
+                close_timeout=10,  # Wait 10 seconds for close to complete
+                compression=None,  # Payloads are mostly base64 audio, deflate only burns CPU
+                ssl=_SSL_CONTEXT
+            ),
+            timeout=CONNECT_TIMEOUT
+        )
+
+
+# model -> list of (dialed_at, connection), and model -> running refill task
+_warm_connections: Dict[str, list] = {}
+_warm_refills: Dict[str, asyncio.Task] = {}
+# Background closes of stale pre-dialed connections, kept referenced until done
+_warm_closes: Set[asyncio.Task] = set()
+
+
+def _is_permanent_connect_error(error: Exception) -> bool:
+    """True if the handshake was rejected with a 4xx status that a retry won't fix"""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status_code", None)
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+def _take_warm_connection(model: str):
+    """Pop a fresh, still-open pre-dialed connection for model, if there is one"""
+    pool = _warm_connections.get(model)
+    now = asyncio.get_running_loop().time()
+    while pool:
+        dialed_at, ws = pool.pop()
+        if ws.close_code is None and now - dialed_at < WARM_MAX_AGE:
+            return ws
+        # Stale or dropped by the server; close it in the background
+        task = asyncio.create_task(ws.close())
+        _warm_closes.add(task)
+        task.add_done_callback(_warm_closes.discard)
+    return None
+
+
+async def _refill_warm_pool(model: str, api_key: str) -> None:
+    """Dial connections until the warm pool for model is back to WARM_POOL_SIZE"""
+    pool = _warm_connections.setdefault(model, [])
+    loop = asyncio.get_running_loop()
+    try:
+        while len(pool) < WARM_POOL_SIZE:
+            ws = await _dial_realtime(model, api_key)
+            pool.append((loop.time(), ws))
+    except Exception as e:
+        logger.warning(f"Could not pre-dial OpenAI Realtime connection: {str(e)}")
+    finally:
+        _warm_refills.pop(model, None)
+
+
+def _schedule_warm_refill(model: str, api_key: str) -> None:
+    """Start a background refill of the warm pool unless one is already running"""
+    if model not in _warm_refills:
+        _warm_refills[model] = asyncio.create_task(_refill_warm_pool(model, api_key))
+
+
+async def close_warm_pool() -> None:
+    """Close every pre-dialed Realtime connection (call on app shutdown)"""
+    refills = list(_warm_refills.values())
+    for task in refills:
+        task.cancel()
+    connections = [ws for pool in _warm_connections.values() for _, ws in pool]
+    _warm_connections.clear()
+    await asyncio.gather(
+        *refills,
+        *list(_warm_closes),
+        *(ws.close() for ws in connections),
+        return_exceptions=True
+    )
+
+
+# business_type -> (source signature, menu) for menus already loaded in this process
+_menu_cache: Dict[str, tuple] = {}
+# business_type -> signature of its sample files, scanned once and again on each refresh
+_menu_signatures: Dict[str, list] = {}
+# business_type -> in-flight MCP extraction, shared by services created meanwhile
+_menu_refreshes: Dict[str, asyncio.Task] = {}
+
+# The filesystem MCP server is launched through npx
+_HAS_NPX = shutil.which("npx") is not None
+
+
+def _menu_source_signature(relevant_dir: str) -> list:
+    """Identify the current contents of a sample_files directory by name, size and mtime"""
+    signature = []
+    with os.scandir(relevant_dir) as entries:
+        for entry in entries:
+            if entry.is_file():
+                stat = entry.stat()
+                signature.append([entry.name, stat.st_size, stat.st_mtime_ns])
+    return sorted(signature)
+
+
+def _load_cached_menu(business_type: str, relevant_dir: str, rescan: bool = False):
+    """
+    Return the cached MCP menu for business_type if its sample files are unchanged
+    
+    The sample files are only scanned the first time and when rescan is set, so
+    creating a service for every call does no disk I/O once the cache is warm.
+    """
+    try:
+        signature = _menu_signatures.get(business_type)
+        if signature is None or rescan:
+            signature = _menu_signatures[business_type] = _menu_source_signature(relevant_dir)
+        cached = _menu_cache.get(business_type)
+        if cached is None:
+            # Remember a missing or unreadable cache file as a miss
+            cached = _menu_cache[business_type] = (None, None)
+            cache_path = os.path.join(MENU_CACHE_DIR, f"mcp-menu-{business_type}.json")
+            with open(cache_path) as f:
+                data = json.load(f)
+            cached = _menu_cache[business_type] = (data["signature"], data["menu"])
+        if cached[0] == signature:
+            return cached[1]
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _store_cached_menu(business_type: str, relevant_dir: str, menu) -> None:
+    """Remember an MCP-extracted menu in memory and on disk"""
+    try:
+        # The signature taken before the extraction describes the files it read
+        signature = _menu_signatures.get(business_type)
+        if signature is None:
+            signature = _menu_signatures[business_type] = _menu_source_signature(relevant_dir)
+        _menu_cache[business_type] = (signature, menu)
+        os.makedirs(MENU_CACHE_DIR, exist_ok=True)
+        cache_path = os.path.join(MENU_CACHE_DIR, f"mcp-menu-{business_type}.json")
+        with open(cache_path, "w") as f:
+            json.dump({"signature": signature, "menu": menu}, f)
+    except (OSError, TypeError) as e:
+        logger.warning(f"Could not cache menu for {business_type}: {str(e)}")
+
+
+# Greeting spoken while the media stream connects, by business type
+CONNECT_GREETINGS = {
+    "restaurant": "Please wait while we connect you to Gourmet Delights restaurant booking assistant.",
+    "salon": "Please wait while we connect you to Elegant Styles salon appointment scheduler.",
+}
+DEFAULT_CONNECT_GREETING = "Please wait while we connect you to our virtual assistant."
+
+
+@functools.lru_cache(maxsize=16)
+def build_connect_twiml(greeting: str, stream_url: str) -> str:
+    """
+    Build the TwiML that greets the caller and connects the media stream
+
+    The output only depends on its arguments, so it is cached and reused
+    across calls instead of rebuilding the XML tree per inbound call.
+    """
+    response = VoiceResponse()
+    response.say(greeting, voice="alice")
+    
+    # Add a brief pause
+    response.pause(length=1)
+    
+    # Set up the media stream connection
+    connect = Connect()
+    connect.stream(url=stream_url)
+    response.append(connect)
+    
+    # Notify the caller that they can start speaking
+    response.say("You're now connected. Please start speaking.", voice="alice")
+    
+    return str(response)
+
+
 class RealtimeService:
     """Service for interacting with OpenAI Realtime API via WebSockets"""
     
+    # Fixed attribute layout: instances live for a whole call and the event
+    # handlers touch these attributes on every delta
+    __slots__ = (
+        "api_key", "client", "ws_connection", "current_call_sid", "voice", "model",
+        "business_type", "system_message", "_system_parts", "collected_info",
+        "menu_items", "_menu_text", "_menu_search_entries", "_menu_word_index", "_menu_term_hits", "_instructions",
+        "conversation_history", "_recent_history", "_item_index", "_user_contents",
+        "_last_assistant_preview", "_pending_items", "_reaper_wakeup",
+        "_function_tasks", "_function_slots", "_function_args", "_event_dispatch", "_menu_task",
+    )
+    
     # Improve the RealtimeService constructor
 
     def __init__(self, business_type: str = "restaurant"):
@@ -31,6 +306,18 @@ class RealtimeService:
 
         self.ws_connection = None
         self.conversation_history = []
+        # Sliding window over the most recent history entries. The lookups below
+        # only cover this window, so their cost does not grow with call length;
+        # the full conversation_history is kept for the stored transcript.
+        self._recent_history = collections.deque(maxlen=HISTORY_WINDOW)
+        # Side indexes over the window: item_id -> entry, and final user texts
+        self._item_index = {}
+        self._user_contents = set()
+        # First characters of the latest assistant message, used for placeholders
+        self._last_assistant_preview = ""
+        # Min-heap of (deadline, item_id) awaiting a transcript, drained by _placeholder_reaper
+        self._pending_items = []
+        self._reaper_wakeup = asyncio.Event()
         self.current_call_sid = None
         self.voice = "alloy"  # Default voice
         self.model = "gpt-4o-realtime-preview"
@@ -48,33 +335,68 @@ class RealtimeService:
         self.business_type = business_type
 
         # Load system message based on business type
-        self.system_message = self._get_system_message(business_type)
+        self._set_system_message(self._get_system_message(business_type))
         
         # Store business-specific data
         self.collected_info = {}
 
-        self.menu_items = self._get_default_menu_items(business_type)
+        # Function calls running in the background, kept referenced until done
+        self._function_tasks = set()
+        self._function_slots = asyncio.Semaphore(MAX_CONCURRENT_FUNCTION_CALLS)
+        # Streamed function-call arguments by call_id
+        self._function_args = {}
+
+        # Realtime event type -> handler, see handle_realtime_events
+        self._event_dispatch = {
+            EVENT_RESPONSE_DONE: self._on_response_done,
+            EVENT_FUNCTION_ARGS_DELTA: self._on_function_args_delta,
+            EVENT_FUNCTION_ARGS_DONE: self._on_function_args_done,
+            EVENT_ASSISTANT_TRANSCRIPT_DELTA: self._on_assistant_delta,
+            EVENT_USER_TRANSCRIPT_DELTA: self._on_user_delta,
+            EVENT_USER_TRANSCRIPT_COMPLETED: self._on_transcription_completed,
+            EVENT_SPEECH_STARTED: self._on_speech_started,
+            EVENT_SPEECH_STOPPED: self._on_speech_stopped,
+            EVENT_BUFFER_COMMITTED: self._on_buffer_committed,
+        }
+
+        # Start from the last MCP-extracted menu if the sample files haven't changed,
+        # so the session gets the real menu without waiting for the MCP round trip
+        cached_menu = _load_cached_menu(business_type, os.path.join(PROJECT_ROOT, "sample_files", business_type))
+        self._set_menu_items(cached_menu or self._get_default_menu_items(business_type))
         
-        asyncio.create_task(self._update_menu_items(business_type))
+        # Keep a reference so the refresh isn't garbage collected mid-flight
+        self._menu_task = asyncio.create_task(self._update_menu_items(business_type))
     
     async def _update_menu_items(self, business_type):
         """Update menu items asynchronously using MCP"""
         try:
-            mcp_data = await self.get_mcp(business_type)
-            if mcp_data:
-                self.menu_items = mcp_data
+            # Concurrent calls for the same business share one MCP server run
+            task = _menu_refreshes.get(business_type)
+            if task is None:
+                task = _menu_refreshes[business_type] = asyncio.create_task(self.get_mcp(business_type))
+                task.add_done_callback(lambda t: _menu_refreshes.pop(business_type, None))
+            mcp_data = await asyncio.shield(task)
+            if mcp_data and mcp_data != self.menu_items:
+                self._set_menu_items(mcp_data)
                 logger.info(f"Successfully updated menu items for {business_type} using MCP")
-        except Exception as e:
-            logger.error(f"Failed to update menu items: {str(e)}")
-            logger.error(traceback.format_exc())
+                
+                # The extraction runs alongside initialize_session, so the session may
+                # already be live with the previous menu; push the new instructions to it
+                if self.ws_connection is not None:
+                    await self.ws_connection.send(_dumps({
+                        "type": "session.update",
+                        "session": {"instructions": self._format_instructions()}
+                    }))
+                    logger.info(f"Sent updated menu to OpenAI session for call {self.current_call_sid}")
+        except Exception:
+            logger.exception("Failed to update menu items")
 
     # Replace your current get_mcp function with this:
     async def get_mcp(self, business_type):
         """Get menu items using MCP to read files"""
         try:
             # Fix the path construction
-            current_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            relevant_dir = os.path.join(current_dir, "sample_files", business_type)
+            relevant_dir = os.path.join(PROJECT_ROOT, "sample_files", business_type)
             
             logger.info(f"Loading data from directory: {relevant_dir}")
             
@@ -83,6 +405,17 @@ class RealtimeService:
                 logger.error(f"Directory not found: {relevant_dir}")
                 return self._get_default_menu_items(business_type)
             
+            # Skip the MCP server entirely if these files were already extracted;
+            # rescan them here, off the event loop, so edits are picked up
+            cached_menu = await asyncio.to_thread(_load_cached_menu, business_type, relevant_dir, True)
+            if cached_menu:
+                logger.info(f"Using cached menu for {business_type}")
+                return cached_menu
+            
+            if not _HAS_NPX:
+                logger.warning("npx not found, cannot start the MCP filesystem server")
+                return self._get_default_menu_items(business_type)
+            
             # Define a nested async function to run with the MCP server
             async def run_with_server(server):
                 agent = Agent(
@@ -96,27 +429,39 @@ class RealtimeService:
                     query = "Extract all menu items with their prices from the restaurant.txt file as JSON"
                 else:
                     query = "Extract all salon services with their prices from the salon.txt file as JSON"
+                
+                # Name every file up front and ask for a single read_multiple_files call,
+                # so the agent doesn't spend a tool round trip per directory listing or file
+                paths = sorted(entry.path for entry in os.scandir(relevant_dir) if entry.is_file())
+                query += (
+                    ". Read all of these files with one read_multiple_files call"
+                    f" instead of listing the directory or reading them one by one: {', '.join(paths)}"
+                )
                     
                 # Get results
                 result = await Runner.run(starting_agent=agent, input=query)
                 return result.final_output
             
-            # Create and use the MCP server
+            # The extracted menu is cached, so the MCP server only runs for this extraction
             async with MCPServerStdio(
                 name="Filesystem Server",
                 params={
                     "command": "npx",
                     "args": ["-y", "@modelcontextprotocol/server-filesystem", relevant_dir],
                 },
+                cache_tools_list=True,
             ) as server:
                 trace_id = gen_trace_id()
                 with trace(workflow_name="Menu Extraction", trace_id=trace_id):
                     logger.info(f"View trace: https://platform.openai.com/traces/trace?trace_id={trace_id}")
-                    return await run_with_server(server)
+                    menu = await run_with_server(server)
+            
+            if menu:
+                await asyncio.to_thread(_store_cached_menu, business_type, relevant_dir, menu)
+            return menu
                     
-        except Exception as e:
-            logger.error(f"Error in get_mcp: {str(e)}")
-            logger.error(traceback.format_exc())
+        except Exception:
+            logger.exception("Error in get_mcp")
 
             
             return self._get_default_menu_items(business_type)
@@ -241,32 +586,73 @@ class RealtimeService:
                 </context>
                 """
                     
+    def _format_instructions(self) -> str:
+        """Return the system message with the current menu filled in"""
+        # Cached until _set_menu_items changes the menu
+        if self._instructions is None:
+            self._instructions = self._format_menu_for_context().join(self._system_parts)
+        return self._instructions
+    
+    def _set_system_message(self, system_message: str) -> None:
+        """Set the system message and split it around the menu placeholder"""
+        self.system_message = system_message
+        self._system_parts = system_message.split("{{menu_items}}")
+        self._instructions = None
+
     def _format_menu_for_context(self):
         """Format menu items to be inserted into system message"""
+        # Rendered once by _set_menu_items
+        return self._menu_text
+    
+    @staticmethod
+    def _render_menu(menu_items) -> str:
+        """Render menu items as the text block embedded in the system message"""
         # If menu_items is already a string, return it directly
-        if isinstance(self.menu_items, str):
-            return self.menu_items
+        if isinstance(menu_items, str):
+            return menu_items
             
         # If it's a dict (due to the default values), format it
-        if isinstance(self.menu_items, dict):
+        if isinstance(menu_items, dict):
             formatted_menu = []
             
-            for category, items in self.menu_items.items():
+            for category, items in menu_items.items():
                 formatted_menu.append(f"{category.upper()}:")
-                for item in items:
-                    formatted_menu.append(f"- {item['name']} ({item['price']}): {item['description']}")
+                formatted_menu.extend(
+                    f"- {item['name']} ({item['price']}): {item['description']}" for item in items
+                )
                 formatted_menu.append("")  # Empty line between categories
             
             return "\n".join(formatted_menu)
         
         # If it's something else, convert to string
-        return str(self.menu_items)
+        return str(menu_items)
+    
+    def _set_menu_items(self, menu_items):
+        """Set the menu items and rebuild the lowercased search entries"""
+        self.menu_items = menu_items
+        self._menu_text = self._render_menu(menu_items)
+        # Rendered instructions embed the menu, re-render on next use
+        self._instructions = None
+        
+        # Structured menus are searchable by name and description; text menus are not
+        self._menu_search_entries = []
+        # word -> indexes of the entries containing it, and memoized term matches
+        self._menu_word_index = {}
+        self._menu_term_hits = {}
+        if isinstance(menu_items, dict):
+            for cat, items in menu_items.items():
+                for item in items:
+                    text = f"{item['name']} {item['description']}".lower()
+                    index = len(self._menu_search_entries)
+                    self._menu_search_entries.append((cat, item, text))
+                    for word in set(text.split()):
+                        self._menu_word_index.setdefault(word, []).append(index)
     
     def set_business_type(self, business_type):
         """Change the business type and update system message and menu items"""
         self.business_type = business_type
-        self.system_message = self._get_system_message(business_type)
-        self.menu_items = self._get_menu_items(business_type)
+        self._set_system_message(self._get_system_message(business_type))
+        self._set_menu_items(self._get_default_menu_items(business_type))
         
         # Reset collected info for the new business type
         self.collected_info = {}
@@ -283,44 +669,46 @@ class RealtimeService:
         try:
             logger.info(f"Connecting to OpenAI Realtime API for call {call_sid}")
 
-            # Generate headers using the SDK's auth method
-            auth_header = f"Bearer {self.client.api_key}"
-
             # Close any existing connection
             if self.ws_connection:
                 await self.ws_connection.close()
                 self.ws_connection = None
 
+            # Use a pre-dialed connection if one is ready
+            self.ws_connection = _take_warm_connection(self.model)
+            connection_success = self.ws_connection is not None
+            if connection_success:
+                logger.info(f"Using pre-dialed OpenAI connection for call {call_sid}")
+
             # Connect with retry logic
             max_retries = 3
             retry_count = 0
-            connection_success = False
             
             while retry_count < max_retries and not connection_success:
                 try:
-                    self.ws_connection = await websockets.connect(
-                        f'wss://api.openai.com/v1/realtime?model={self.model}',
-                        additional_headers={
-                            "Authorization": auth_header,
-                            "OpenAI-Beta": "realtime=v1"
-                        },
-                        ping_interval=20,  # Send regular pings to keep connection alive
-                        ping_timeout=20,   # Wait 20 seconds for pong before considering dead
-                        close_timeout=10   # Wait 10 seconds for close to complete
-                    )
+                    # Bound the handshake so a stuck attempt doesn't eat the whole retry budget
+                    self.ws_connection = await _dial_realtime(self.model, self.client.api_key)
                     connection_success = True
                 except Exception as e:
                     retry_count += 1
                     logger.error(f"Connection attempt {retry_count} failed: {str(e)}")
+                    if _is_permanent_connect_error(e):
+                        # Bad key, model or request - retrying won't help
+                        break
                     if retry_count < max_retries:
-                        await asyncio.sleep(1.0)  # Wait before retrying
+                        # Exponential backoff with jitter before retrying
+                        delay = min(CONNECT_BACKOFF_BASE * (2 ** retry_count), CONNECT_BACKOFF_MAX)
+                        await asyncio.sleep(delay + random.random() * 0.05)
             
             if not connection_success:
                 logger.error("Failed to connect to OpenAI after multiple attempts")
                 return False
 
+            # Have a connection ready for the next call
+            _schedule_warm_refill(self.model, self.client.api_key)
+
             # Prepare system message with menu items
-            formatted_system_message = self.system_message.replace("{{menu_items}}", self._format_menu_for_context())
+            formatted_system_message = self._format_instructions()
             
             # Define any tools (function calling)
             tools = self._get_mcp_tools(self.business_type) if hasattr(self, '_get_mcp_tools') else None
@@ -365,7 +753,7 @@ class RealtimeService:
                     # Tools are already in correct format or invalid
                     session_update['session']['tools'] = tools
 
-            await self.ws_connection.send(json.dumps(session_update))
+            await self.ws_connection.send(_dumps(session_update))
             
             # Send initial prompt to start the conversation
             await self.send_initial_prompt()
@@ -400,31 +788,71 @@ class RealtimeService:
         else:
             return {"error": "Function not implemented or not available for this business type"}
 
+    async def _run_function_call(self, call_id, function_name, raw_arguments):
+        """Execute a function call and send its output back to the model"""
+        try:
+            arguments = _loads(raw_arguments)
+            async with self._function_slots:
+                result = await self._handle_function_call(function_name, arguments)
+            
+            # Send the result back to the model and ask it to continue
+            function_output = {
+                "type": "conversation.item.create",
+                "item": {
+                    "type": "function_call_output",
+                    "call_id": call_id,
+                    "output": _dumps(result)
+                }
+            }
+            
+            await self.ws_connection.send(_dumps(function_output))
+            await self.ws_connection.send(RESPONSE_CREATE)
+            logger.info(f"Sent function result for {function_name}")
+        except Exception as e:
+            logger.error(f"Error running function {function_name}: {str(e)}")
+
     async def _search_menu(self, arguments):
         """Search the restaurant menu"""
-        query = arguments.get("query", "").lower()
+        terms = arguments.get("query", "").lower().split()
         category = arguments.get("category")
         
-        results = []
+        # An empty query matches everything; otherwise an item matches if any
+        # query term occurs in its text
+        entries = self._menu_search_entries
+        if terms:
+            matched = set()
+            for term in terms:
+                matched |= self._match_menu_term(term)
+            entries = [entries[i] for i in sorted(matched)]
         
-        # If category is specified, only search in that category
-        categories_to_search = [category] if category else self.menu_items.keys()
-        
-        for cat in categories_to_search:
-            if cat in self.menu_items:
-                for item in self.menu_items[cat]:
-                    # Search in name and description
-                    if (query in item["name"].lower() or 
-                        query in item["description"].lower()):
-                        results.append({
-                            "name": item["name"],
-                            "price": item["price"],
-                            "description": item["description"],
-                            "category": cat
-                        })
+        results = []
+        for cat, item, text in entries:
+            # If category is specified, only search in that category
+            if category and cat != category:
+                continue
+            results.append({
+                "name": item["name"],
+                "price": item["price"],
+                "description": item["description"],
+                "category": cat
+            })
         
         return {"results": results, "count": len(results)}
 
+    def _match_menu_term(self, term: str) -> frozenset:
+        """Return the indexes of menu entries whose text contains term"""
+        hits = self._menu_term_hits.get(term)
+        if hits is None:
+            # A whitespace-free term is a substring of the text exactly when it is
+            # a substring of one of its words, so only distinct words are scanned
+            hits = frozenset(
+                i
+                for word, indexes in self._menu_word_index.items() if term in word
+                for i in indexes
+            )
+            self._menu_term_hits[term] = hits
+        return hits
+
     # Implement the remaining functions similarly
 
 
@@ -435,26 +863,11 @@ class RealtimeService:
             return
         
         try:
-            # Create a conversation item with a greeting prompt
-            initial_conversation_item = {
-                "type": "conversation.item.create",
-                "item": {
-                    "type": "message",
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "input_text",
-                            "text": "Please greet the user and ask for their name."
-                        }
-                    ]
-                }
-            }
-            
-            # Send the conversation item
-            await self.ws_connection.send(json.dumps(initial_conversation_item))
+            # Send the conversation item with a greeting prompt
+            await self.ws_connection.send(INITIAL_PROMPT_ITEM)
             
             # Create a response
-            await self.ws_connection.send(json.dumps({"type": "response.create"}))
+            await self.ws_connection.send(RESPONSE_CREATE)
             
             logger.info("Initial prompt sent to start conversation")
         except Exception as e:
@@ -471,13 +884,10 @@ class RealtimeService:
         try:
             # Don't check .closed attribute - it doesn't exist
             # Instead, just try to send and handle exceptions
-            audio_append = {
-                "type": "input_audio_buffer.append",
-                "audio": audio_data
-            }
-            
-            await self.ws_connection.send(json.dumps(audio_append))
-            logger.debug("Audio chunk sent to OpenAI")
+            # Base64 never needs JSON escaping, so splice it into the fixed envelope
+            await self.ws_connection.send(AUDIO_APPEND_PREFIX + audio_data + AUDIO_APPEND_SUFFIX)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Audio chunk sent to OpenAI")
         except websockets.exceptions.ConnectionClosed:
             logger.warning("WebSocket connection to OpenAI closed while sending audio")
         except Exception as e:
@@ -485,6 +895,8 @@ class RealtimeService:
     
     async def close_session(self) -> None:
         """Close the WebSocket connection"""
+        # Stop waiting for a menu refresh; the shared extraction keeps running
+        self._menu_task.cancel()
         if self.ws_connection:
             try:
                 await self.ws_connection.close()
@@ -502,18 +914,8 @@ class RealtimeService:
         Returns:
             Formatted URL string for Twilio Media Streams
         """
-        # Remove protocol prefix if present
-        if ngrok_url.startswith('http://'):
-            ngrok_url = ngrok_url[7:]
-        elif ngrok_url.startswith('https://'):
-            ngrok_url = ngrok_url[8:]
-            
-        # Remove trailing slash if present
-        if ngrok_url.endswith('/'):
-            ngrok_url = ngrok_url[:-1]
-            
         # Use the root path for the WebSocket connection, not /api/v1/
-        return f'wss://{ngrok_url}/realtime-stream'
+        return f'wss://{normalize_ngrok_url(ngrok_url)}/realtime-stream'
     
     def generate_twilio_response(self, ngrok_url: str) -> str:
         """
@@ -525,33 +927,71 @@ class RealtimeService:
         Returns:
             TwiML response as a string
         """
-        response = VoiceResponse()
+        greeting = CONNECT_GREETINGS.get(self.business_type, DEFAULT_CONNECT_GREETING)
+        return build_connect_twiml(greeting, self.get_twilio_stream_url(ngrok_url))
+    
+    # Complete the _prepare_shutdown method
+
+    def _append_delta(self, role: str, delta: str, item_id: Optional[str] = None) -> None:
+        """
+        Append a streamed transcript delta to the conversation history
         
-        # Add business-specific greeting message
-        if self.business_type == "restaurant":
-            greeting = "Please wait while we connect you to Gourmet Delights restaurant booking assistant."
-        elif self.business_type == "salon":
-            greeting = "Please wait while we connect you to Elegant Styles salon appointment scheduler."
+        In-flight entries buffer their deltas in a "_chunks" list instead of
+        growing "content" with repeated string concatenation; the text is
+        joined once by _materialize when it is read.
+        """
+        history = self.conversation_history
+        if history and history[-1]["role"] == role:
+            entry = history[-1]
+            chunks = entry.get("_chunks")
+            if chunks is None:
+                entry["_chunks"] = chunks = [entry.pop("content", "")]
+            chunks.append(delta)
         else:
-            greeting = "Please wait while we connect you to our virtual assistant."
-        
-        response.say(greeting, voice="alice")
-        
-        # Add a brief pause
-        response.pause(length=1)
-        
-        # Set up the media stream connection
-        connect = Connect()
-        stream_url = self.get_twilio_stream_url(ngrok_url)
-        connect.stream(url=stream_url)
-        response.append(connect)
-        
-        # Notify the caller that they can start speaking
-        response.say("You're now connected. Please start speaking.", voice="alice")
+            entry = {"role": role, "_chunks": [delta]}
+            if item_id is not None:
+                entry["item_id"] = item_id
+            self._append_history(entry)
+
+    def _append_history(self, entry: Dict) -> None:
+        """Append an entry to the conversation history and index it by item_id"""
+        recent = self._recent_history
+        if len(recent) == recent.maxlen:
+            # The oldest entry is about to slide out of the window; unindex it
+            evicted = recent[0]
+            evicted_id = evicted.get("item_id")
+            if evicted_id is not None and self._item_index.get(evicted_id) is evicted:
+                del self._item_index[evicted_id]
+            if evicted["role"] == ROLE_USER:
+                self._forget_user_content(evicted)
         
-        return str(response)
-    
-    # Complete the _prepare_shutdown method
+        self.conversation_history.append(entry)
+        recent.append(entry)
+        item_id = entry.get("item_id")
+        if item_id is not None:
+            self._item_index[item_id] = entry
+
+    def _forget_user_content(self, entry: Dict) -> None:
+        """Drop a user entry's content from the dedupe set unless another windowed entry still has it"""
+        content = entry.get("content")
+        for other in self._recent_history:
+            if other is not entry and other["role"] == ROLE_USER and other.get("content") == content:
+                return
+        self._user_contents.discard(content)
+
+    @staticmethod
+    def _materialize(entry: Dict) -> Dict:
+        """Join any buffered delta chunks of a history entry into its content"""
+        chunks = entry.pop("_chunks", None)
+        if chunks is not None:
+            entry["content"] = "".join(chunks)
+        return entry
+
+    def get_history(self) -> List[Dict]:
+        """Return the conversation history with every entry's content materialized"""
+        for entry in self.conversation_history:
+            self._materialize(entry)
+        return self.conversation_history
 
     async def _prepare_shutdown(self):
         """Helper method to cleanly shut down the connection after a delay"""
@@ -569,6 +1009,191 @@ class RealtimeService:
         except Exception as e:
             logger.error(f"Error during clean shutdown: {str(e)}")
     
+    async def _placeholder_reaper(self, seen_items: Set[str]) -> None:
+        """
+        Add placeholders for committed audio items whose transcript never arrived
+        
+        Committed item_ids are pushed onto a min-heap of deadlines; this one task
+        sleeps until the earliest deadline (or until woken by a new item) instead
+        of spawning a sleeping task per committed event.
+        """
+        loop = asyncio.get_running_loop()
+        pending = self._pending_items
+        while True:
+            self._reaper_wakeup.clear()
+            if not pending:
+                await self._reaper_wakeup.wait()
+                continue
+            
+            delay = pending[0][0] - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._reaper_wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            _, item_id = heapq.heappop(pending)
+            self._add_placeholder(item_id, seen_items)
+
+    def _add_placeholder(self, item_id: str, seen_items: Set[str]) -> None:
+        """Add a placeholder user message if no transcript was received for item_id"""
+        # If we already have a transcript for this item_id, there is nothing to do
+        if item_id in seen_items:
+            return
+        
+        logger.warning("No transcript received for item %s after %s seconds, adding placeholder", item_id, PLACEHOLDER_DELAY)
+        
+        # Add a placeholder with context about the missing transcript
+        # First check if we already have a user message for this item
+        if item_id in self._item_index:
+            return
+        
+        # Try to capture what the user might have been responding to
+        preview = self._last_assistant_preview
+        if preview:
+            placeholder = PLACEHOLDER_WITH_CONTEXT.format(preview=preview)
+        else:
+            placeholder = PLACEHOLDER_NO_CONTEXT
+        
+        # Add to conversation history
+        self._append_history({
+            "role": ROLE_USER, 
+            "content": placeholder,
+            "item_id": item_id
+        })
+        logger.info("Added placeholder for missing transcript: %s", placeholder)
+        
+        # Update tracking
+        seen_items.add(item_id)
+        self._user_contents.add(placeholder)
+
+    # Event handlers, dispatched by type from handle_realtime_events
+
+    def _on_response_done(self, event: Dict, seen_items: Set[str]) -> None:
+        """Handle response completion"""
+        # No delay here: response.done fires after every assistant turn, and
+        # waiting would hold up the next one. _prepare_shutdown handles the
+        # grace period when the connection is actually closing.
+        logger.info("Response complete")
+        
+        # The assistant turn is final now; join its chunks once instead of
+        # keeping the chunk list alive until the history is read at hangup
+        history = self.conversation_history
+        if history and history[-1]["role"] == ROLE_ASSISTANT:
+            self._materialize(history[-1])
+
+    def _on_function_args_delta(self, event: Dict, seen_items: Set[str]) -> None:
+        """Accumulate streamed function-call arguments as they arrive"""
+        self._function_args.setdefault(event.get('call_id'), []).append(event.get('delta', ''))
+
+    def _on_function_args_done(self, event: Dict, seen_items: Set[str]) -> None:
+        """Handle function calls from the model once the arguments are complete"""
+        call_id = event.get('call_id')
+        buffered = self._function_args.pop(call_id, None)
+        raw_arguments = event.get('arguments') or "".join(buffered or []) or '{}'
+        function_name = event.get('name')
+        
+        logger.info(f"Model wants to call function: {function_name}")
+        
+        # Execute the function off the receive loop so audio keeps flowing
+        task = asyncio.create_task(
+            self._run_function_call(call_id, function_name, raw_arguments)
+        )
+        self._function_tasks.add(task)
+        task.add_done_callback(self._function_tasks.discard)
+
+    def _on_assistant_delta(self, event: Dict, seen_items: Set[str]) -> None:
+        """Store assistant transcript for later reference"""
+        if 'delta' in event:
+            delta = event['delta']
+            history = self.conversation_history
+            if not history or history[-1]["role"] != ROLE_ASSISTANT:
+                # A new assistant message starts a new preview
+                self._last_assistant_preview = ""
+            if len(self._last_assistant_preview) < ASSISTANT_PREVIEW_LENGTH:
+                self._last_assistant_preview = (self._last_assistant_preview + delta)[:ASSISTANT_PREVIEW_LENGTH]
+            
+            # Add to conversation history
+            self._append_delta(ROLE_ASSISTANT, delta)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Added assistant transcript: %s", event['delta'])
+
+    def _on_user_delta(self, event: Dict, seen_items: Set[str]) -> None:
+        """Handle user's speech transcript"""
+        if 'delta' in event and 'item_id' in event:
+            item_id = event['item_id']
+            delta = event['delta']
+            logger.info("User transcript delta for item %s: %s", item_id, delta)
+            
+            # Only presence matters here, the text itself lives in the history
+            seen_items.add(item_id)
+            
+            # Also update conversation history
+            self._append_delta(ROLE_USER, delta, item_id)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Added user transcript delta: %s", delta)
+
+    def _on_transcription_completed(self, event: Dict, seen_items: Set[str]) -> None:
+        """Handle completed transcription"""
+        if 'transcript' in event and 'item_id' in event:
+            item_id = event['item_id']
+            transcript = event['transcript']
+            logger.info("Received complete user transcript for item %s: %s", item_id, transcript)
+            
+            # Nothing was transcribed; leave the item to the placeholder reaper
+            if not transcript:
+                return
+            
+            # Update our item-based tracking
+            seen_items.add(item_id)
+            
+            # Check if we already have this exact transcript
+            transcript_exists = False
+            entry = self._item_index.get(item_id)
+            if entry is not None:
+                # If we already have a partial transcript for this item,
+                # replace it with the complete one
+                entry.pop("_chunks", None)
+                self._forget_user_content(entry)
+                entry["content"] = transcript
+                self._user_contents.add(transcript)
+                transcript_exists = True
+            elif transcript in self._user_contents:
+                # Or if we happen to have the exact content already
+                transcript_exists = True
+            
+            # Add transcript if it doesn't exist yet
+            if not transcript_exists:
+                self._append_history({
+                    "role": ROLE_USER, 
+                    "content": transcript,
+                    "item_id": item_id
+                })
+                self._user_contents.add(transcript)
+                logger.info("Added complete user transcript: %s", transcript)
+
+    def _on_speech_started(self, event: Dict, seen_items: Set[str]) -> None:
+        """Handle speech start detection"""
+        logger.info("User started speaking")
+
+    def _on_speech_stopped(self, event: Dict, seen_items: Set[str]) -> None:
+        """Handle speech stop detection"""
+        logger.info("User stopped speaking")
+
+    def _on_buffer_committed(self, event: Dict, seen_items: Set[str]) -> None:
+        """Handle buffer commit event - important for transcript tracking"""
+        logger.info("Input buffer committed, transcript should follow")
+        if 'item_id' in event:
+            item_id = event['item_id']
+            logger.info("Item ID: %s", item_id)
+
+            # Instead of immediately adding a placeholder, schedule a check with
+            # the placeholder reaper in case no transcript arrives in time
+            loop = asyncio.get_running_loop()
+            heapq.heappush(self._pending_items, (loop.time() + PLACEHOLDER_DELAY, item_id))
+            self._reaper_wakeup.set()
+
     async def handle_realtime_events(self, on_audio_callback: Callable[[str], None]) -> None:
         """
         Listen for events from the OpenAI Realtime API
@@ -580,11 +1205,18 @@ class RealtimeService:
             logger.error("Cannot listen for events: WebSocket not connected")
             return
         
-        # Track transcripts by item_id
-        transcripts_by_item = {}
+        # Track which item_ids have received any transcript
+        seen_items = set()
         # Flag to track if we're shutting down
         shutting_down = False
         
+        # Single task that adds placeholders for committed items without a transcript
+        reaper = asyncio.create_task(self._placeholder_reaper(seen_items))
+        # Hoist lookups used on every message into locals
+        dispatch = self._event_dispatch
+        loads = _loads
+        intern = sys.intern
+        
         try:
             async for message in self.ws_connection:
 
@@ -592,13 +1224,40 @@ class RealtimeService:
                     logger.debug("Skipping message processing during shutdown")
                     continue
 
-                event = json.loads(message)
+                # Fast path for audio deltas, by far the most frequent event: when the
+                # frame has the usual layout (type first, delta last) slice the base64
+                # payload out directly instead of parsing the whole frame
+                if on_audio_callback and isinstance(message, str) and message.startswith(AUDIO_DELTA_PREFIX):
+                    start = message.find(AUDIO_DELTA_FIELD)
+                    if start != -1:
+                        start += len(AUDIO_DELTA_FIELD)
+                        end = len(message) - 2
+                        # Base64 has no quotes, so the only one left must close the delta;
+                        # a backslash means the encoder escaped something, so parse instead
+                        if message.endswith('"}') and message.find('"', start) == end and '\\' not in message:
+                            on_audio_callback(message[start:end])
+                            continue
+
+                event = loads(message)
+                etype = event.get('type')
+                if etype is not None:
+                    # Decoded strings are fresh objects; interning lets the dispatch
+                    # lookup and the comparisons below match on identity
+                    etype = intern(etype)
                 
-                # Log the event type
-                logger.info(f"Received event from OpenAI: {event.get('type')}")
+                # Log the event type (debug only, this runs for every audio delta)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Received event from OpenAI: %s", etype)
+
+                # Handle audio from OpenAI to send back to Twilio
+                if etype == EVENT_AUDIO_DELTA:
+                    # The delta contains base64 encoded audio data
+                    # Call the callback to send audio back to Twilio
+                    if 'delta' in event and on_audio_callback:
+                        on_audio_callback(event['delta'])
 
                 # Handle error events specifically
-                if event.get('type') == 'error':
+                elif etype == EVENT_ERROR:
                     error_details = event.get('error', {})
                     logger.error(f"Error from OpenAI: {error_details}")
                     # Don't shut down on non-fatal errors
@@ -612,170 +1271,17 @@ class RealtimeService:
                         await self._prepare_shutdown()
                         break
 
-                # Handle response completion - signal clean shutdown
-                if event.get('type') == 'response.done':
-                    logger.info("Response complete")                    
-                    # Allow a short delay for any final messages to be processed
-                    # await asyncio.sleep(1.0)
-                
-                # Handle audio from OpenAI to send back to Twilio
-                if event.get('type') == 'response.audio.delta' and 'delta' in event:
-                    # The delta contains base64 encoded audio data
-                    audio_data = event['delta']
-                    
-                    # Call the callback to send audio back to Twilio
-                    if on_audio_callback:
-                        on_audio_callback(audio_data)
-
-                
-
-                # Handle function calls from the model
-                elif event.get('type') == 'response.function_call':
-                    if 'function' in event:
-                        function_data = event['function']
-                        function_name = function_data.get('name')
-                        arguments = json.loads(function_data.get('arguments', '{}'))
-                        
-                        logger.info(f"Model wants to call function: {function_name}")
-                        
-                        # Execute the function
-                        result = await self._handle_function_call(function_name, arguments)
-                        
-                        # Send the result back to the model
-                        function_response = {
-                            "type": "response.function_call.result",
-                            "result": json.dumps(result)
-                        }
-                        
-                        await self.ws_connection.send(json.dumps(function_response))
-                        logger.info(f"Sent function result for {function_name}")
-                
-                # Store transcript for later reference
-                elif event.get('type') == 'response.audio_transcript.delta':
-                    if 'delta' in event:
-                        # Add to conversation history
-                        if not self.conversation_history or self.conversation_history[-1]["role"] != "assistant":
-                            self.conversation_history.append({"role": "assistant", "content": event['delta']})
-                        else:
-                            self.conversation_history[-1]["content"] += event['delta']
-                        logger.debug(f"Added assistant transcript: {event['delta']}")
-                
-                # Handle user's speech transcript
-                elif event.get('type') == 'conversation.item.input_audio_transcription.delta':
-                    if 'delta' in event and 'item_id' in event:
-                        item_id = event['item_id']
-                        delta = event['delta']
-                        logger.info(f"User transcript delta for item {item_id}: {delta}")
-                        
-                        # Track transcripts by item_id to handle interim results better
-                        if item_id not in transcripts_by_item:
-                            transcripts_by_item[item_id] = delta
-                        else:
-                            transcripts_by_item[item_id] += delta
-                        
-                        # Also update conversation history
-                        if not self.conversation_history or self.conversation_history[-1]["role"] != "user":
-                            self.conversation_history.append({"role": "user", "content": delta})
-                        else:
-                            self.conversation_history[-1]["content"] += delta
-                        logger.debug(f"Added user transcript delta: {delta}")
-                
-                # Handle completed transcription
-                elif event.get('type') == 'conversation.item.input_audio_transcription.completed':
-                    if 'transcript' in event and 'item_id' in event:
-                        item_id = event['item_id']
-                        transcript = event['transcript']
-                        logger.info(f"Received complete user transcript for item {item_id}: {transcript}")
-                        
-                        # Update our item-based tracking
-                        transcripts_by_item[item_id] = transcript
-                        
-                        # Check if we already have this exact transcript
-                        transcript_exists = False
-                        for i, entry in enumerate(self.conversation_history):
-                            if entry["role"] == "user":
-                                # If we already have a partial transcript for this item,
-                                # replace it with the complete one
-                                if entry.get('item_id') == item_id:
-                                    self.conversation_history[i]["content"] = transcript
-                                    transcript_exists = True
-                                    break
-                                # Or if we happen to have the exact content already
-                                elif entry["content"] == transcript:
-                                    transcript_exists = True
-                                    break
-                        
-                        # Add transcript if it doesn't exist yet
-                        if not transcript_exists:
-                            self.conversation_history.append({
-                                "role": "user", 
-                                "content": transcript,
-                                "item_id": item_id
-                            })
-                            logger.info(f"Added complete user transcript: {transcript}")
-                
-                # Handle speech detection events
-                elif event.get('type') == 'input_audio_buffer.speech_started':
-                    logger.info("User started speaking")
-                
-                elif event.get('type') == 'input_audio_buffer.speech_stopped':
-                    logger.info("User stopped speaking")
-                    
-                # Handle buffer commit event - important for transcript tracking
-                elif event.get('type') == 'input_audio_buffer.committed':
-                    logger.info("Input buffer committed, transcript should follow")
-                    if 'item_id' in event:
-                        item_id = event['item_id']
-                        logger.info(f"Item ID: {item_id}")
-
-                        # Instead of immediately adding a placeholder, set a flag to add it later
-                        # if we don't receive a transcript within a reasonable time
-                        
-                        # Start a task to add a placeholder after a delay if no transcript arrives
-                        async def add_placeholder_after_delay(item_id):
-                            await asyncio.sleep(2.0)  # Wait 2 seconds for transcript to arrive
-                            
-                            # If we still don't have a transcript for this item_id, add a placeholder
-                            if item_id not in transcripts_by_item or not transcripts_by_item[item_id]:
-                                logger.warning(f"No transcript received for item {item_id} after 2 seconds, adding placeholder")
-                                
-                                # Add a placeholder with context about the missing transcript
-                                # First check if we already have a user message for this item
-                                user_msg_exists = False
-                                for entry in self.conversation_history:
-                                    if entry.get("role") == "user" and entry.get("item_id") == item_id:
-                                        user_msg_exists = True
-                                        break
-                                
-                                if not user_msg_exists:
-                                    # Try to capture what the user might have been responding to
-                                    last_assistant_msg = ""
-                                    for entry in reversed(self.conversation_history):
-                                        if entry.get("role") == "assistant":
-                                            last_assistant_msg = entry.get("content", "")
-                                            break
-                                    
-                                    context = f"[Responding to: '{last_assistant_msg[:30]}...']" if last_assistant_msg else ""
-                                    placeholder = f"[User response not transcribed {context}]"
-                                    
-                                    # Add to conversation history
-                                    self.conversation_history.append({
-                                        "role": "user", 
-                                        "content": placeholder,
-                                        "item_id": item_id
-                                    })
-                                    logger.info(f"Added placeholder for missing transcript: {placeholder}")
-                                    
-                                    # Update tracking
-                                    transcripts_by_item[item_id] = placeholder
-                        
-                        # Start the delayed task without awaiting it
-                        asyncio.create_task(add_placeholder_after_delay(item_id))
+                else:
+                    handler = dispatch.get(etype)
+                    if handler is not None:
+                        handler(event, seen_items)
 
         except websockets.exceptions.ConnectionClosed:
             logger.info("WebSocket connection to OpenAI was closed")
-        except Exception as e:
-            logger.error(f"Error in realtime event handler: {str(e)}")
-            logger.error(traceback.format_exc())
-
-       
\ No newline at end of file
+        except Exception:
+            logger.exception("Error in realtime event handler")
+        finally:
+            reaper.cancel()
+            # Function results have nowhere to go once the socket is gone
+            for task in list(self._function_tasks):
+                task.cancel()
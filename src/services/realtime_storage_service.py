@@ -1,12 +1,9 @@
-import os
-import json
+import asyncio
 import logging
-import base64
 from datetime import datetime
-import tempfile
-import subprocess
 from src.services.storage_service import StorageService
-from src.utils.audio_converter import convert_base64_ulaw_chunks_to_wav
+from src.utils.audio_converter import write_ulaw_as_wav, write_ulaw_as_stereo_wav
+from src.utils.helpers import json_dumps_indented
 
 logger = logging.getLogger(__name__)
 
@@ -23,72 +20,68 @@ class RealtimeStorageService:
         Args:
             call_sid: The Twilio call SID
             conversation_history: List of conversation messages in the format [{"role": "user/assistant", "content": "text"}]
-            audio_chunks: Optional list of base64 encoded audio chunks from the conversation
+            audio_chunks: Optional dict of raw g711_ulaw audio per speaker ("user", "assistant")
         
         Returns:
             dict: Information about the storage operation
         """
         try:
-            logger.info(f"Starting storage for call {call_sid} with {len(conversation_history)} messages and {len(audio_chunks) if audio_chunks else 0} audio chunks")
+            logger.info(f"Starting storage for call {call_sid} with {len(conversation_history)} messages and {len(audio_chunks) if audio_chunks else 0} audio tracks")
 
 
             
             if audio_chunks:
-                user_chunks = len(audio_chunks.get("user", []))
-                assistant_chunks = len(audio_chunks.get("assistant", []))
-                logger.info(f"Audio chunks: {user_chunks} user, {assistant_chunks} assistant")
+                user_bytes = len(audio_chunks.get("user", b""))
+                assistant_bytes = len(audio_chunks.get("assistant", b""))
+                logger.info(f"Audio bytes: {user_bytes} user, {assistant_bytes} assistant")
             
 
             
-            timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            # One clock reading names every stored file and stamps the transcript
+            now = datetime.now()
+            timestamp = now.strftime("%Y%m%d-%H%M%S")
             
-            # Create transcript from conversation history
+            # Transcript and per-speaker audio are independent uploads; run the
+            # blocking GCS calls in threads so their round-trips overlap
+            uploads = {}
             if conversation_history:
-                transcript_text = self._create_transcript_from_history(conversation_history)
-                transcript_path = f"transcripts/{call_sid}/{timestamp}.txt"
-                logger.info(f"Storing transcript at path: {transcript_path}")
-                transcript_url = self.storage_service.storage.store_file(
-                    transcript_path, 
-                    transcript_text, 
-                    content_type="text/plain"
+                uploads["transcript"] = asyncio.to_thread(
+                    self._store_transcript,
+                    call_sid,
+                    now,
+                    conversation_history
                 )
-                logger.info(f"Stored transcript at: {transcript_url}")
             else:
-                transcript_url = None
                 logger.warning("No conversation history to store for transcript")
             
-            # Process and store audio chunks if provided
-            audio_urls = {"user": None, "assistant": None}
-            
             if audio_chunks:
-                # Store user audio if available
-                if audio_chunks.get("user") and len(audio_chunks["user"]) > 0:
-                    logger.info(f"Storing {len(audio_chunks['user'])} user audio chunks for call {call_sid}")
-                    audio_urls["user"] = self._store_audio_chunks(
-                        call_sid, 
-                        f"{timestamp}_user", 
-                        audio_chunks["user"]
-                    )
-                
-                # Store assistant audio if available
-                if audio_chunks.get("assistant") and len(audio_chunks["assistant"]) > 0:
-                    logger.info(f"Storing {len(audio_chunks['assistant'])} assistant audio chunks for call {call_sid}")
-                    audio_urls["assistant"] = self._store_audio_chunks(
-                        call_sid, 
-                        f"{timestamp}_assistant", 
-                        audio_chunks["assistant"]
-                    )
+                for speaker in ("user", "assistant"):
+                    if audio_chunks.get(speaker):
+                        logger.info(f"Storing {len(audio_chunks[speaker])} bytes of {speaker} audio for call {call_sid}")
+                        uploads[speaker] = asyncio.to_thread(
+                            self._store_audio_chunks,
+                            call_sid,
+                            f"{timestamp}_{speaker}",
+                            audio_chunks[speaker]
+                        )
                 
-                # Create combined audio if both user and assistant audio are available
-                if audio_urls["user"] and audio_urls["assistant"]:
+                # The stereo mix is built from the same in-memory tracks, so it
+                # uploads alongside them
+                if audio_chunks.get("user") and audio_chunks.get("assistant"):
                     logger.info("Creating combined audio file with both user and assistant audio")
-                    audio_urls["combined"] = self._combine_user_and_assistant_audio(
+                    uploads["combined"] = asyncio.to_thread(
+                        self._combine_user_and_assistant_audio,
                         call_sid,
                         timestamp,
-                        audio_urls["user"],
-                        audio_urls["assistant"]
+                        audio_chunks["user"],
+                        audio_chunks["assistant"]
                     )
-        
+            
+            results = dict(zip(uploads, await asyncio.gather(*uploads.values())))
+            transcript_url = results.get("transcript")
+            audio_urls = {"user": results.get("user"), "assistant": results.get("assistant")}
+            if "combined" in results:
+                audio_urls["combined"] = results["combined"]
             
             # Create metadata record
             metadata = {
@@ -103,9 +96,10 @@ class RealtimeStorageService:
             # Store metadata
             metadata_path = f"metadata/{call_sid}/{timestamp}.json"
             logger.info(f"Storing metadata at path: {metadata_path}")
-            metadata_url = self.storage_service.storage.store_file(
+            metadata_url = await asyncio.to_thread(
+                self.storage_service.storage.store_file,
                 metadata_path, 
-                json.dumps(metadata, indent=2), 
+                json_dumps_indented(metadata), 
                 content_type="application/json"
             )
             
@@ -118,19 +112,30 @@ class RealtimeStorageService:
             }
             
         except Exception as e:
-            logger.error(f"Error storing realtime conversation: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception(f"Error storing realtime conversation: {str(e)}")
             return {
                 "success": False,
                 "error": str(e)
             }
         
-    def _create_transcript_from_history(self, conversation_history: list) -> str:
+    def _store_transcript(self, call_sid: str, now: datetime, conversation_history: list) -> str:
+        """Format the conversation history and store it as a text transcript"""
+        transcript_text = self._create_transcript_from_history(conversation_history, now)
+        transcript_path = f"transcripts/{call_sid}/{now.strftime('%Y%m%d-%H%M%S')}.txt"
+        logger.info(f"Storing transcript at path: {transcript_path}")
+        transcript_url = self.storage_service.storage.store_file(
+            transcript_path, 
+            transcript_text, 
+            content_type="text/plain"
+        )
+        logger.info(f"Stored transcript at: {transcript_url}")
+        return transcript_url
+    
+    def _create_transcript_from_history(self, conversation_history: list, now: datetime) -> str:
         """Convert conversation history to a clearly formatted readable transcript"""
         
         # Format the timestamp for the transcript
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
         
         # Start with header
         formatted_text = [
@@ -139,21 +144,19 @@ class RealtimeStorageService:
             ""  # Empty line after header
         ]
         
-        # Process each conversation turn
-        for entry in conversation_history:
-            speaker = "AI Assistant" if entry["role"] == "assistant" else "User"
-            text = entry.get("content", "")
-            turn_time = datetime.now().strftime("%H:%M:%S")
-            
-            # Format speaker with clear separation
+        # Turns carry no capture time, so they all share the storage time;
+        # build each speaker's heading and its separator once
+        turn_time = now.strftime("%H:%M:%S")
+        headings = {}
+        for role, speaker in (("assistant", "AI Assistant"), ("user", "User")):
             speaker_line = f"[{turn_time}] {speaker}:"
-            separator = "-" * len(speaker_line)
-            
-            # Add formatted turn to transcript
-            formatted_text.append(speaker_line)
-            formatted_text.append(separator)
-            formatted_text.append(text)
-            formatted_text.append("")  # Empty line between turns
+            headings[role] = f"{speaker_line}\n{'-' * len(speaker_line)}"
+        
+        # Process each conversation turn, with an empty line between turns
+        formatted_text.extend(
+            f"{headings['assistant' if entry['role'] == 'assistant' else 'user']}\n{entry.get('content', '')}\n"
+            for entry in conversation_history
+        )
         
         # Add footer
         formatted_text.append("=" * 50)
@@ -162,21 +165,10 @@ class RealtimeStorageService:
         # Join with newlines
         return "\n".join(formatted_text)
     
-    def _store_audio_chunks(self, call_sid: str, timestamp: str, audio_chunks: list) -> dict:
+    def _store_audio_chunks(self, call_sid: str, timestamp: str, ulaw_audio: bytearray) -> dict:
         try:
-            # Debug info
-            logger.info(f"Storing {len(audio_chunks)} audio chunks for call {call_sid}")
-            
-            # Decode base64 audio chunks and concatenate
-            decoded_chunks = []
-            for i, chunk in enumerate(audio_chunks):
-                try:
-                    decoded_chunk = base64.b64decode(chunk)
-                    decoded_chunks.append(decoded_chunk)
-                except Exception as e:
-                    logger.error(f"Failed to decode chunk {i}: {str(e)}")
-            
-            combined_audio = b''.join(decoded_chunks)
+            # The audio was decoded as it arrived; the GCS client only uploads bytes
+            combined_audio = bytes(ulaw_audio)
             logger.info(f"Combined audio size: {len(combined_audio)} bytes")
             
             # Store the raw audio data
@@ -191,20 +183,15 @@ class RealtimeStorageService:
             
             # 2. Convert to WAV format and store
             try:
-                from src.utils.audio_converter import convert_ulaw_to_wav
-                
-                # Convert the combined audio to WAV format
-                wav_data = convert_ulaw_to_wav(combined_audio)
-                
-                # Store WAV file
+                # Stream the WAV to GCS as it is decoded rather than building
+                # the whole (twice as large) PCM file in memory
                 wav_audio_path = f"audio/{call_sid}/{timestamp}.wav"
                 logger.info(f"Storing WAV audio at path: {wav_audio_path}")
                 
-                wav_audio_url = self.storage_service.storage.store_file(
-                    wav_audio_path,
-                    wav_data,
-                    content_type="audio/wav"
-                )
+                storage = self.storage_service.storage
+                with storage.open_stream(wav_audio_path, content_type="audio/wav") as stream:
+                    write_ulaw_as_wav(combined_audio, stream)
+                wav_audio_url = storage.get_url(wav_audio_path)
                 
                 logger.info(f"Stored WAV audio at: {wav_audio_url}")
                 
@@ -221,13 +208,11 @@ class RealtimeStorageService:
                 }
                 
         except Exception as e:
-            logger.error(f"Error storing audio chunks: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception(f"Error storing audio chunks: {str(e)}")
             return None
         
     def _combine_user_and_assistant_audio(self, call_sid: str, timestamp: str, 
-                                     user_audio_url: dict, assistant_audio_url: dict) -> str:
+                                     user_audio: bytes, assistant_audio: bytes) -> str:
         """
         Combine user and assistant audio into a single stereo WAV file
         with user on left channel and assistant on right channel
@@ -235,77 +220,24 @@ class RealtimeStorageService:
         Args:
             call_sid: The call SID
             timestamp: Timestamp string for the filename
-            user_audio_url: Dict with user audio URLs
-            assistant_audio_url: Dict with assistant audio URLs
+            user_audio: Raw g711_ulaw user audio
+            assistant_audio: Raw g711_ulaw assistant audio
             
         Returns:
             str: URL of the combined audio file
         """
         try:
-            # Check if we have both WAV files
-            if not user_audio_url or not assistant_audio_url:
-                logger.warning("Missing one or both audio files for combining")
-                return None
-                
-            user_wav_url = user_audio_url.get("wav_url")
-            assistant_wav_url = assistant_audio_url.get("wav_url")
-            
-            if not user_wav_url or not assistant_wav_url:
-                logger.warning("Missing WAV URL for one or both participants")
-                return None
-                
-            # Create temporary files to download the WAVs
-            with tempfile.NamedTemporaryFile(suffix='_user.wav', delete=False) as user_temp, \
-                tempfile.NamedTemporaryFile(suffix='_assistant.wav', delete=False) as assistant_temp, \
-                tempfile.NamedTemporaryFile(suffix='_combined.wav', delete=False) as combined_temp:
-                
-                # Get WAV file paths
-                user_temp_path = user_temp.name
-                assistant_temp_path = assistant_temp.name
-                combined_temp_path = combined_temp.name
-            
-            # Extract bucket name and file paths from GCS URLs
-            bucket_name = self.storage_service.storage.bucket_name
-            user_wav_path = user_wav_url.replace(f"gs://{bucket_name}/", "")
-            assistant_wav_path = assistant_wav_url.replace(f"gs://{bucket_name}/", "")
-            
-            # Download WAV files from GCS
-            user_blob = self.storage_service.storage.bucket.blob(user_wav_path)
-            user_blob.download_to_filename(user_temp_path)
-            
-            assistant_blob = self.storage_service.storage.bucket.blob(assistant_wav_path)
-            assistant_blob.download_to_filename(assistant_temp_path)
-            
-            # Use Sox to combine the files
-            # Mix both into a stereo file with user on left channel, assistant on right
-            cmd = [
-                'sox', 
-                '-M',  # Mix channels
-                user_temp_path, assistant_temp_path,  # Input files
-                combined_temp_path,  # Output file
-            ]
-            
-            # Execute combination
-            subprocess.run(cmd, check=True)
-            
-            # Upload combined file
+            # Mix straight from the in-memory tracks and stream the result up,
+            # instead of downloading both WAVs again and shelling out to SoX
             combined_path = f"audio/{call_sid}/{timestamp}_combined.wav"
-            combined_url = self.storage_service.storage.store_file(
-                combined_path,
-                open(combined_temp_path, 'rb').read(),
-                content_type="audio/wav"
-            )
-            
-            # Clean up temp files
-            os.unlink(user_temp_path)
-            os.unlink(assistant_temp_path)
-            os.unlink(combined_temp_path)
+            storage = self.storage_service.storage
+            with storage.open_stream(combined_path, content_type="audio/wav") as stream:
+                write_ulaw_as_stereo_wav(user_audio, assistant_audio, stream)
+            combined_url = storage.get_url(combined_path)
             
             logger.info(f"Created combined audio at: {combined_url}")
             return combined_url
             
         except Exception as e:
-            logger.error(f"Error combining audio files: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception(f"Error combining audio files: {str(e)}")
             return None
\ No newline at end of file
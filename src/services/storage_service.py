@@ -1,20 +1,29 @@
-from src.core.storage import CloudStorage
+from src.core.storage import CloudStorage, upload_with_retry
+from src.utils.helpers import json_dumps_indented
 from datetime import datetime
-import json
+import functools
 import logging
 import os
 from twilio.rest import Client
 
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _get_twilio_client() -> Client:
+    """Create the process-wide Twilio client on first use"""
+    return Client(
+        os.getenv('TWILIO_ACCOUNT_SID'),
+        os.getenv('TWILIO_AUTH_TOKEN')
+    )
+
 class StorageService:
     def __init__(self):
         self.storage = CloudStorage()
-        # Initialize Twilio client
-        self.twilio_client = Client(
-            os.getenv('TWILIO_ACCOUNT_SID'),
-            os.getenv('TWILIO_AUTH_TOKEN')
-        )
+
+    @property
+    def twilio_client(self) -> Client:
+        """Twilio client, only needed when fetching call recordings"""
+        return _get_twilio_client()
 
     import datetime
     import json
@@ -38,15 +47,17 @@ class StorageService:
             
             # Upload metadata as JSON (includes transcript)
             metadata_blob = self.storage.bucket.blob(metadata_path)
-            metadata_blob.upload_from_string(
-                json.dumps(recording_data, indent=2),
+            upload_with_retry(
+                metadata_blob,
+                json_dumps_indented(recording_data),
                 content_type="application/json"
             )
             
             # Create a reference file that points to the Twilio recording URL
             audio_reference_path = f"{base_path}/audio_reference_{timestamp}.txt"
             audio_reference_blob = self.storage.bucket.blob(audio_reference_path)
-            audio_reference_blob.upload_from_string(
+            upload_with_retry(
+                audio_reference_blob,
                 recording_data.get("recording_url", "No URL available"),
                 content_type="text/plain"
             )
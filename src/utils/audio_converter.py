@@ -1,83 +1,106 @@
-import os
-import tempfile
-import subprocess
+import struct
 import logging
-import base64
 
 logger = logging.getLogger(__name__)
 
-def convert_ulaw_to_wav(ulaw_data: bytes) -> bytes:
+# Twilio media streams are 8kHz mono g711_ulaw
+SAMPLE_RATE = 8000
+
+# Samples decoded per write when streaming a WAV, ten seconds of audio
+WAV_WRITE_FRAMES = SAMPLE_RATE * 10
+
+# g711_ulaw code for a zero sample, used to pad the shorter track
+ULAW_SILENCE = b'\xff'
+
+def _ulaw_to_linear(code: int) -> int:
+    """Decode one g711_ulaw byte to a 16-bit linear sample"""
+    code = ~code & 0xFF
+    magnitude = (((code & 0x0F) << 3) + 0x84) << ((code >> 4) & 0x07)
+    return 0x84 - magnitude if code & 0x80 else magnitude - 0x84
+
+# Low and high bytes of the decoded little-endian samples, as bytes.translate tables
+_ULAW_SAMPLES = [_ulaw_to_linear(code) & 0xFFFF for code in range(256)]
+_ULAW_LOW = bytes(sample & 0xFF for sample in _ULAW_SAMPLES)
+_ULAW_HIGH = bytes(sample >> 8 for sample in _ULAW_SAMPLES)
+
+def ulaw_to_pcm16(ulaw_data: bytes) -> bytes:
+    """Decode g711_ulaw audio to 16-bit little-endian PCM"""
+    pcm = bytearray(2 * len(ulaw_data))
+    pcm[0::2] = ulaw_data.translate(_ULAW_LOW)
+    pcm[1::2] = ulaw_data.translate(_ULAW_HIGH)
+    return bytes(pcm)
+
+def _ulaw_to_stereo_pcm16(left: bytes, right: bytes) -> bytes:
+    """Decode two equal-length g711_ulaw tracks to interleaved 16-bit stereo PCM"""
+    pcm = bytearray(4 * len(left))
+    pcm[0::4] = left.translate(_ULAW_LOW)
+    pcm[1::4] = left.translate(_ULAW_HIGH)
+    pcm[2::4] = right.translate(_ULAW_LOW)
+    pcm[3::4] = right.translate(_ULAW_HIGH)
+    return bytes(pcm)
+
+def _wav_header(n_frames: int, channels: int = 1) -> bytes:
+    """Build the 44-byte RIFF header of a 16-bit PCM WAV with n_frames frames"""
+    block_align = 2 * channels
+    data_size = block_align * n_frames
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, SAMPLE_RATE, block_align * SAMPLE_RATE, block_align, 16,
+        b'data', data_size
+    )
+
+def write_ulaw_as_wav(ulaw_data: bytes, fileobj) -> None:
     """
-    Convert g711_ulaw audio data to WAV format
+    Write g711_ulaw audio data to a writable file object as a WAV
+    
+    The PCM is decoded and written in slices, so only a slice is held in
+    memory at a time. fileobj does not need to be seekable.
     
     Args:
         ulaw_data: The raw g711_ulaw audio data
-        
-    Returns:
-        bytes: The WAV-formatted audio data
+        fileobj: Writable binary file object, left open
     """
-    try:
-        # Create temporary files
-        with tempfile.NamedTemporaryFile(suffix='.ul', delete=False) as f_in, \
-             tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f_out:
-            
-            # Write ulaw data to temp file
-            f_in.write(ulaw_data)
-            f_in.flush()
-            
-            # Get file paths
-            ulaw_path = f_in.name
-            wav_path = f_out.name
-        
-        # Use SoX (Sound eXchange) to convert ulaw to wav
-        # Make sure SoX is installed: brew install sox
-        cmd = [
-            'sox', 
-            '-t', 'ul', '-r', '8000', '-c', '1',  # Input format: ulaw, 8kHz, mono
-            ulaw_path,
-            '-t', 'wav', '-r', '8000', '-c', '1',  # Output format: wav, 8kHz, mono
-            wav_path
-        ]
-        
-        # Execute conversion
-        subprocess.run(cmd, check=True)
-        
-        # Read the resulting WAV file
-        with open(wav_path, 'rb') as f:
-            wav_data = f.read()
-        
-        # Clean up temporary files
-        os.unlink(ulaw_path)
-        os.unlink(wav_path)
-        
-        return wav_data
+    # The length is known up front, so the header is written once and never patched
+    fileobj.write(_wav_header(len(ulaw_data)))
+    for start in range(0, len(ulaw_data), WAV_WRITE_FRAMES):
+        fileobj.write(ulaw_to_pcm16(ulaw_data[start:start + WAV_WRITE_FRAMES]))
+
+def write_ulaw_as_stereo_wav(left: bytes, right: bytes, fileobj) -> None:
+    """
+    Write two g711_ulaw tracks to a writable file object as one stereo WAV
     
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error converting ulaw to WAV: {e}")
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error in audio conversion: {e}")
-        raise
+    The shorter track is padded with silence. Like write_ulaw_as_wav, the PCM
+    is decoded and written in slices and fileobj does not need to be seekable.
+    
+    Args:
+        left: The raw g711_ulaw audio for the left channel
+        right: The raw g711_ulaw audio for the right channel
+        fileobj: Writable binary file object, left open
+    """
+    n_frames = max(len(left), len(right))
+    fileobj.write(_wav_header(n_frames, channels=2))
+    for start in range(0, n_frames, WAV_WRITE_FRAMES):
+        size = min(WAV_WRITE_FRAMES, n_frames - start)
+        fileobj.write(_ulaw_to_stereo_pcm16(
+            left[start:start + size].ljust(size, ULAW_SILENCE),
+            right[start:start + size].ljust(size, ULAW_SILENCE)
+        ))
 
-def convert_base64_ulaw_chunks_to_wav(ulaw_chunks: list) -> bytes:
+def convert_ulaw_to_wav(ulaw_data: bytes) -> bytes:
     """
-    Convert a list of base64-encoded g711_ulaw audio chunks to WAV format
+    Convert g711_ulaw audio data to WAV format
     
     Args:
-        ulaw_chunks: List of base64-encoded g711_ulaw audio chunks
+        ulaw_data: The raw g711_ulaw audio data
         
     Returns:
-        bytes: The WAV-formatted audio data
+        bytes: The WAV-formatted audio data (16-bit PCM, 8kHz, mono)
     """
     try:
-        # Decode base64 and concatenate chunks
-        decoded_chunks = [base64.b64decode(chunk) for chunk in ulaw_chunks]
-        combined_ulaw = b''.join(decoded_chunks)
-        
-        # Convert to WAV
-        wav_data = convert_ulaw_to_wav(combined_ulaw)
-        return wav_data
+        # Decode in-process with lookup tables instead of shelling out to SoX
+        return _wav_header(len(ulaw_data)) + ulaw_to_pcm16(ulaw_data)
     
     except Exception as e:
-        logger.error(f"Error converting ulaw chunks to WAV: {e}")
-        raise
\ No newline at end of file
+        logger.error(f"Unexpected error in audio conversion: {e}")
+        raise
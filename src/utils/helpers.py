@@ -1,3 +1,27 @@
+import json
+import functools
+
+# orjson is much faster on the small JSON frames exchanged with Twilio and OpenAI;
+# fall back to the stdlib. Encoded messages stay str so they go out as text frames.
+try:
+    import orjson
+    json_loads = orjson.loads
+
+    def json_dumps(obj) -> str:
+        """Serialize obj to a JSON string."""
+        return orjson.dumps(obj).decode()
+
+    def json_dumps_indented(obj) -> bytes:
+        """Serialize obj to pretty-printed UTF-8 JSON, for stored documents."""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    json_loads = json.loads
+    json_dumps = json.dumps
+
+    def json_dumps_indented(obj) -> bytes:
+        """Serialize obj to pretty-printed UTF-8 JSON, for stored documents."""
+        return json.dumps(obj, indent=2).encode()
+
 def format_transcript(transcript: str) -> str:
     """Format the transcript for better readability."""
     return transcript.strip().capitalize()
@@ -10,4 +34,10 @@ def log_event(event: str) -> None:
 def validate_audio_file(file_path: str) -> bool:
     """Validate the audio file format and existence."""
     valid_formats = ['.wav', '.mp3']
-    return any(file_path.endswith(ext) for ext in valid_formats)
\ No newline at end of file
+    return any(file_path.endswith(ext) for ext in valid_formats)
+
+@functools.lru_cache(maxsize=16)
+def normalize_ngrok_url(ngrok_url: str) -> str:
+    """Strip the scheme and trailing slash from a public base URL (e.g. NGROK_URL)."""
+    # Host headers arrive without a scheme, so only strip what is there
+    return ngrok_url.removeprefix("https://").removeprefix("http://").rstrip("/")
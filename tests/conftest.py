@@ -1,7 +1,27 @@
+import logging.config
+
 import pytest
 
+# Root logging setup shared by every test module, applied once per session
+LOGGING_CONFIG = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "default": {"format": "%(asctime)s - %(levelname)s - %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "default"},
+    },
+    "root": {"level": "INFO", "handlers": ["console"]},
+}
+
+@pytest.fixture(scope="session", autouse=True)
+def _logging():
+    logging.config.dictConfig(LOGGING_CONFIG)
+    yield
+
 @pytest.fixture(scope="module")
 def sample_fixture():
     # Setup code for the fixture
     yield
-    # Teardown code for the fixture
\ No newline at end of file
+    # Teardown code for the fixture
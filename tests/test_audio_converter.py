@@ -0,0 +1,31 @@
+import io
+import wave
+
+from src.utils.audio_converter import convert_ulaw_to_wav, ulaw_to_pcm16, write_ulaw_as_stereo_wav
+
+def test_ulaw_to_pcm16_decodes_reference_values():
+    # 0xFF and 0x7F are the two zero codes, 0x00 and 0x80 the extremes
+    assert ulaw_to_pcm16(bytes([0xFF, 0x7F, 0x00, 0x80])) == (
+        (0).to_bytes(2, "little", signed=True)
+        + (0).to_bytes(2, "little", signed=True)
+        + (-32124).to_bytes(2, "little", signed=True)
+        + (32124).to_bytes(2, "little", signed=True)
+    )
+
+def test_convert_ulaw_to_wav_writes_8khz_mono_pcm():
+    wav_data = convert_ulaw_to_wav(bytes(range(256)) * 4)
+    with wave.open(io.BytesIO(wav_data), 'rb') as wav_file:
+        assert wav_file.getnchannels() == 1
+        assert wav_file.getsampwidth() == 2
+        assert wav_file.getframerate() == 8000
+        assert wav_file.getnframes() == 1024
+
+def test_write_ulaw_as_stereo_wav_pads_shorter_track_with_silence():
+    buffer = io.BytesIO()
+    write_ulaw_as_stereo_wav(bytes([0x00, 0x00]), bytes([0x80]), buffer)
+    with wave.open(io.BytesIO(buffer.getvalue()), 'rb') as wav_file:
+        assert wav_file.getnchannels() == 2
+        assert wav_file.getnframes() == 2
+        frames = wav_file.readframes(2)
+    samples = [int.from_bytes(frames[i:i + 2], "little", signed=True) for i in range(0, 8, 2)]
+    assert samples == [-32124, 32124, -32124, 0]
@@ -0,0 +1,64 @@
+import io
+import types
+
+import pytest
+
+from src.core.storage import CloudStorage
+
+UPLOAD_URL = "https://storage.googleapis.com/upload/storage/v1/b/bucket/o?upload_id=abc"
+
+class FakeTransport:
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, url):
+        self.deleted.append(url)
+
+class FakeBlobWriter:
+    """Mimics the parts of BlobWriter (google-cloud-storage 2.13) that open_stream uses"""
+
+    def __init__(self, started=True):
+        self._buffer = io.BytesIO()
+        self.transport = FakeTransport()
+        # Set once the first chunk has opened the resumable session
+        upload = types.SimpleNamespace(upload_url=UPLOAD_URL)
+        self._upload_and_transport = (upload, self.transport) if started else None
+        self.close_calls = 0
+
+    def write(self, data):
+        return self._buffer.write(data)
+
+    def close(self):
+        self.close_calls += 1
+
+def _storage(writer):
+    blob = types.SimpleNamespace(open=lambda mode, **kwargs: writer)
+    storage = CloudStorage.__new__(CloudStorage)
+    storage.bucket = types.SimpleNamespace(blob=lambda path: blob)
+    return storage
+
+def test_open_stream_finalizes_the_upload_when_the_block_completes():
+    writer = FakeBlobWriter()
+    with _storage(writer).open_stream("recordings/CA1/call.wav", "audio/wav") as stream:
+        stream.write(b"RIFF")
+    assert writer.close_calls == 1
+    assert writer.transport.deleted == []
+
+def test_open_stream_cancels_the_upload_when_the_block_raises():
+    writer = FakeBlobWriter()
+    with pytest.raises(RuntimeError):
+        with _storage(writer).open_stream("recordings/CA1/call.wav", "audio/wav") as stream:
+            stream.write(b"RIFF")
+            raise RuntimeError("conversion failed")
+    # close() would commit the truncated object, so the session is deleted instead
+    assert writer.close_calls == 0
+    assert writer.transport.deleted == [UPLOAD_URL]
+    assert writer._buffer.closed
+
+def test_open_stream_error_before_the_first_chunk_only_drops_the_buffer():
+    writer = FakeBlobWriter(started=False)
+    with pytest.raises(RuntimeError):
+        with _storage(writer).open_stream("recordings/CA1/call.wav"):
+            raise RuntimeError("conversion failed")
+    assert writer.close_calls == 0
+    assert writer._buffer.closed
@@ -2,7 +2,6 @@ import requests
 import logging
 from urllib.parse import urlencode
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def test_conversation_flow():
@@ -35,4 +34,5 @@ def test_conversation_flow():
         logger.error(f"❌ Test failed: {str(e)}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     test_conversation_flow()
\ No newline at end of file
@@ -0,0 +1,9 @@
+from src.utils.helpers import normalize_ngrok_url
+
+def test_normalize_ngrok_url_strips_scheme_and_slash():
+    assert normalize_ngrok_url("https://abc.ngrok.io/") == "abc.ngrok.io"
+    assert normalize_ngrok_url("http://abc.ngrok.io") == "abc.ngrok.io"
+
+def test_normalize_ngrok_url_accepts_bare_host():
+    assert normalize_ngrok_url("abc.ngrok.io") == "abc.ngrok.io"
+    assert normalize_ngrok_url("localhost:8000/") == "localhost:8000"
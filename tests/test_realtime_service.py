@@ -0,0 +1,185 @@
+import asyncio
+import json
+
+from src.services import realtime_service
+from src.services.realtime_service import RealtimeService
+
+class FakeRealtimeConnection:
+    """Replays Realtime server frames and records what the service sends back"""
+
+    def __init__(self, frames):
+        # A number in frames pauses the stream for that many seconds
+        self.frames = list(frames)
+        self.sent = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while self.frames:
+            frame = self.frames.pop(0)
+            if isinstance(frame, (int, float)):
+                await asyncio.sleep(frame)
+                continue
+            await asyncio.sleep(0)
+            return frame if isinstance(frame, str) else json.dumps(frame)
+        raise StopAsyncIteration
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def close(self):
+        pass
+
+async def _no_menu_refresh(self, business_type):
+    return None
+
+def _run_events(monkeypatch, frames):
+    """Feed frames through handle_realtime_events; return the service and the forwarded audio"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(RealtimeService, "_update_menu_items", _no_menu_refresh)
+    audio = []
+
+    async def run():
+        service = RealtimeService("restaurant")
+        service.ws_connection = FakeRealtimeConnection(frames)
+        await service.handle_realtime_events(audio.append)
+        return service
+
+    return asyncio.run(run()), audio
+
+def _user_delta(item_id, delta):
+    return {"type": "conversation.item.input_audio_transcription.delta", "item_id": item_id, "delta": delta}
+
+def _user_completed(item_id, transcript):
+    return {"type": "conversation.item.input_audio_transcription.completed", "item_id": item_id, "transcript": transcript}
+
+def _assistant_delta(delta):
+    return {"type": "response.audio_transcript.delta", "delta": delta}
+
+def _user_contents(service):
+    return [entry["content"] for entry in service.get_history() if entry["role"] == "user"]
+
+def test_audio_deltas_are_forwarded_in_order(monkeypatch):
+    frames = [
+        # Usual compact layout, sliced without parsing
+        '{"type":"response.audio.delta","event_id":"e1","item_id":"i1","output_index":0,"content_index":0,"delta":"QUJD"}',
+        # Other layouts fall back to parsing the frame
+        '{"type": "response.audio.delta", "delta": "REVG"}',
+        '{"type":"response.audio.delta","delta":"R0hJ","item_id":"i1"}',
+        {"delta": "SktM", "type": "response.audio.delta"},
+        # Escaped characters are left to the parser to unescape
+        '{"type":"response.audio.delta","delta":"TU5P\\/w=="}',
+    ]
+    service, audio = _run_events(monkeypatch, frames)
+    assert audio == ["QUJD", "REVG", "R0hJ", "SktM", "TU5P/w=="]
+    assert service.get_history() == []
+
+def test_process_audio_chunk_sends_input_audio_append(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(RealtimeService, "_update_menu_items", _no_menu_refresh)
+
+    async def run():
+        service = RealtimeService("restaurant")
+        service.ws_connection = FakeRealtimeConnection([])
+        await service.process_audio_chunk("f39/fw==")
+        return service.ws_connection.sent
+
+    sent = asyncio.run(run())
+    assert [json.loads(message) for message in sent] == [
+        {"type": "input_audio_buffer.append", "audio": "f39/fw=="}
+    ]
+
+def test_completed_transcript_replaces_user_deltas(monkeypatch):
+    service, _ = _run_events(monkeypatch, [
+        _assistant_delta("What is your name?"),
+        _user_delta("i1", "my na"),
+        _user_delta("i1", "me is"),
+        _user_completed("i1", "My name is Sam."),
+    ])
+    assert service.get_history() == [
+        {"role": "assistant", "content": "What is your name?"},
+        {"role": "user", "item_id": "i1", "content": "My name is Sam."},
+    ]
+
+def test_reaper_adds_placeholder_for_missing_transcript(monkeypatch):
+    monkeypatch.setattr(realtime_service, "PLACEHOLDER_DELAY", 0.01)
+    service, _ = _run_events(monkeypatch, [
+        _assistant_delta("Welcome to Gourmet Delights, what is your name?"),
+        {"type": "response.done"},
+        {"type": "input_audio_buffer.committed", "item_id": "i1"},
+        0.1,
+        # An empty transcript counts as missing too
+        {"type": "input_audio_buffer.committed", "item_id": "i2"},
+        _user_completed("i2", ""),
+        0.1,
+    ])
+    placeholder = "[User response not transcribed [Responding to: 'Welcome to Gourmet Delights, w...']]"
+    assert _user_contents(service) == [placeholder, placeholder]
+    assert [entry.get("item_id") for entry in service.get_history()] == [None, "i1", "i2"]
+
+def test_transcript_arriving_in_time_suppresses_placeholder(monkeypatch):
+    monkeypatch.setattr(realtime_service, "PLACEHOLDER_DELAY", 0.05)
+    service, _ = _run_events(monkeypatch, [
+        {"type": "input_audio_buffer.committed", "item_id": "i1"},
+        _user_completed("i1", "Table for two"),
+        0.1,
+    ])
+    assert _user_contents(service) == ["Table for two"]
+
+def test_duplicate_user_transcript_is_suppressed(monkeypatch):
+    service, _ = _run_events(monkeypatch, [
+        _user_completed("i1", "Yes"),
+        _assistant_delta("Great."),
+        _user_completed("i2", "Yes"),
+    ])
+    assert _user_contents(service) == ["Yes"]
+
+def test_window_eviction_keeps_dedupe_for_entries_still_in_window(monkeypatch):
+    monkeypatch.setattr(realtime_service, "HISTORY_WINDOW", 4)
+    service, _ = _run_events(monkeypatch, [
+        _user_completed("i1", "Yes"),
+        _assistant_delta("Seven pm?"),
+        # A second "Yes" entry, built from deltas and then completed
+        _user_delta("i2", "Ye"),
+        _user_completed("i2", "Yes"),
+        _assistant_delta("For how many?"),
+        # Evicts the first "Yes"; the second one is still in the window
+        _user_completed("i3", "Two"),
+        _user_completed("i4", "Yes"),
+    ])
+    assert _user_contents(service) == ["Yes", "Yes", "Two"]
+
+def test_window_eviction_forgets_content_that_left_the_window(monkeypatch):
+    monkeypatch.setattr(realtime_service, "HISTORY_WINDOW", 2)
+    service, _ = _run_events(monkeypatch, [
+        _user_completed("i1", "Yes"),
+        _assistant_delta("Seven pm?"),
+        _user_completed("i2", "Two"),
+        _assistant_delta("Anything else?"),
+        _user_completed("i3", "Yes"),
+    ])
+    assert _user_contents(service) == ["Yes", "Two", "Yes"]
+
+def test_function_call_arguments_are_buffered_until_done(monkeypatch):
+    calls = []
+
+    async def echo_function_call(self, function_name, arguments):
+        calls.append((function_name, arguments))
+        return {"echo": arguments}
+
+    monkeypatch.setattr(RealtimeService, "_handle_function_call", echo_function_call)
+    service, _ = _run_events(monkeypatch, [
+        {"type": "response.function_call_arguments.delta", "call_id": "c1", "delta": '{"query":'},
+        {"type": "response.function_call_arguments.delta", "call_id": "c1", "delta": ' "samosa"}'},
+        {"type": "response.function_call_arguments.done", "call_id": "c1", "name": "search_menu"},
+        0.05,
+    ])
+    assert calls == [("search_menu", {"query": "samosa"})]
+    output, create = [json.loads(message) for message in service.ws_connection.sent]
+    assert output["type"] == "conversation.item.create"
+    assert output["item"]["type"] == "function_call_output"
+    assert output["item"]["call_id"] == "c1"
+    assert json.loads(output["item"]["output"]) == {"echo": {"query": "samosa"}}
+    assert create == {"type": "response.create"}
+    assert service._function_args == {}
@@ -1,59 +1,79 @@
 import sys
+import time
+import itertools
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
-# Add project root to Python path
-project_root = str(Path(__file__).parent.parent)
-sys.path.append(project_root)
+# Add project root to Python path, once even if the module is imported again
+project_root = str(Path(__file__).resolve().parents[1])
+if project_root not in sys.path:
+    sys.path.append(project_root)
 
-from src.core.storage import CloudStorage
-from datetime import datetime
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Suffix that keeps test call SIDs unique when runs start in the same second
+_sid_counter = itertools.count()
+
+# Encoded once; store_file uploads bytes as-is
+TEST_TRANSCRIPT = (
+    "🗣️ User: Hello\n"
+    "🤖 Bot: Hi! How can I help you?\n"
+    "🗣️ User: I need assistance\n"
+    "🤖 Bot: I'll be happy to help!"
+).encode("utf-8")
+
+def _format_listing(storage, prefix: str, icon: str) -> str:
+    """Render a listing as one block of lines, streamed from GCS page by page"""
+    return "\n".join(
+        f"{icon} {file['name']} ({file['size']} bytes)"
+        for file in storage.iter_files(prefix)
+    )
+
 def verify_storage():
+    # Imported here so collecting this module doesn't load the GCS stack
+    from src.core.storage import CloudStorage
+    
     try:
         # Initialize storage
         storage = CloudStorage()
-        test_call_sid = f"TEST_CALL_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        test_call_sid = f"TEST_CALL_{int(time.time())}_{next(_sid_counter)}"
         
-        # 1. Store a test transcript
-        logger.info("\n1. Testing transcript storage...")
-        test_transcript = (
-            "🗣️ User: Hello\n"
-            "🤖 Bot: Hi! How can I help you?\n"
-            "🗣️ User: I need assistance\n"
-            "🤖 Bot: I'll be happy to help!"
-        )
-        transcript_url = storage.store_transcript(test_call_sid, test_transcript)
-        logger.info(f"✅ Transcript stored at: {transcript_url}")
-        
-        # 2. Store a test audio file
-        logger.info("\n2. Testing audio storage...")
         test_audio = b"Test audio content"
         audio_path = f"audio/{test_call_sid}/test.wav"
-        audio_url = storage.store_file(audio_path, test_audio, 'audio/wav')
-        logger.info(f"✅ Audio stored at: {audio_url}")
+        
+        # The two uploads are independent, and so are the two listings once the
+        # uploads are done, so each pair runs concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # 1. Store a test transcript and 2. a test audio file
+            logger.info("\n1. Testing transcript storage...")
+            logger.info("\n2. Testing audio storage...")
+            transcript_future = executor.submit(storage.store_transcript, test_call_sid, TEST_TRANSCRIPT)
+            audio_future = executor.submit(storage.store_file, audio_path, test_audio, 'audio/wav')
+            logger.info(f"✅ Transcript stored at: {transcript_future.result()}")
+            logger.info(f"✅ Audio stored at: {audio_future.result()}")
+            
+            transcript_listing = executor.submit(_format_listing, storage, "transcripts/", "📝")
+            audio_listing = executor.submit(_format_listing, storage, "audio/", "🎵")
+            transcript_files = transcript_listing.result()
+            audio_files = audio_listing.result()
         
         # 3. List stored files
         logger.info("\n3. Listing stored files:")
         
         logger.info("\nTranscripts:")
         logger.info("-" * 50)
-        transcript_files = storage.list_files("transcripts/")
-        for file in transcript_files:
-            logger.info(f"📝 {file['name']} ({file['size']} bytes)")
+        logger.info(transcript_files)
         
         logger.info("\nAudio files:")
         logger.info("-" * 50)
-        audio_files = storage.list_files("audio/")
-        for file in audio_files:
-            logger.info(f"🎵 {file['name']} ({file['size']} bytes)")
+        logger.info(audio_files)
         
     except Exception as e:
         logger.error(f"❌ Verification failed: {str(e)}")
         raise
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     verify_storage()
\ No newline at end of file
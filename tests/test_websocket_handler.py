@@ -0,0 +1,23 @@
+from src.core.websocket_handler import _media_payload
+
+def test_media_payload_slices_audio_from_media_frames():
+    frame = (
+        '{"event":"media","sequenceNumber":"3","media":{"track":"inbound","chunk":"1",'
+        '"timestamp":"5","payload":"f39/fw+A=="},"streamSid":"MZ1"}'
+    )
+    assert _media_payload(frame) == "f39/fw+A=="
+    # A payload field outside the media object is skipped
+    assert _media_payload('{"event":"media","payload":"f39/","media":{"payload":"AAAA"}}') == "AAAA"
+
+def test_media_payload_leaves_other_frames_to_the_parser():
+    assert _media_payload('{"event":"start","start":{"streamSid":"MZ1","callSid":"CA1"}}') is None
+    assert _media_payload('{"event":"stop","streamSid":"MZ1"}') is None
+    # Media frames in another layout, or without a payload, are parsed normally
+    assert _media_payload('{"streamSid":"MZ1","event":"media","media":{"payload":"f39/"}}') is None
+    assert _media_payload('{"event":"media","media":{"track":"inbound"}}') is None
+    # Only a payload inside the media object counts
+    assert _media_payload('{"event":"media","media":{"track":"inbound"},"payload":"f39/"}') is None
+
+def test_media_payload_leaves_escaped_frames_to_the_parser():
+    frame = '{"event":"media","media":{"track":"inbound","payload":"f39\\/fw=="},"streamSid":"MZ1"}'
+    assert _media_payload(frame) is None